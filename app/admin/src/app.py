@@ -1,10 +1,14 @@
+import time
+
 import streamlit as st
 from utils import (
     add_custom_css, footer, get_tenants, validate_tenant_name, create_tenant,
     upload_knowledge_base, delete_tenant, set_current_tenant, query_knowledge_base,
-    delete_tenant_files, get_tenant_files
+    delete_tenant_files, get_tenant_files, get_job, describe_job_progress
 )
 
+JOB_POLL_INTERVAL = 2
+
 # Initialize session state
 if 'current_tenant' not in st.session_state:
     st.session_state.current_tenant = None
@@ -12,14 +16,29 @@ if 'current_tenant_id' not in st.session_state:
     st.session_state.current_tenant_id = None
 if 'tenant_files' not in st.session_state:
     st.session_state.tenant_files = None
+if 'tenant_files_cursor' not in st.session_state:
+    st.session_state.tenant_files_cursor = None
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "pending_jobs" not in st.session_state:
+    st.session_state.pending_jobs = []
 
 
 def refresh_tenant_data():
-    st.session_state.tenants_data = get_tenants()
+    st.session_state.tenants_data, st.session_state.tenants_cursor = get_tenants()
     if st.session_state.current_tenant_id:
-        st.session_state.tenant_files = get_tenant_files(st.session_state.current_tenant_id)
+        st.session_state.tenant_files, st.session_state.tenant_files_cursor = get_tenant_files(
+            st.session_state.current_tenant_id)
+
+
+def load_more_tenants():
+    tenants, st.session_state.tenants_cursor = get_tenants(st.session_state.tenants_cursor)
+    st.session_state.tenants_data.extend(tenants)
+
+
+def load_more_files(tenant_id):
+    files, st.session_state.tenant_files_cursor = get_tenant_files(tenant_id, st.session_state.tenant_files_cursor)
+    st.session_state.tenant_files.extend(files)
 
 
 def handle_create_tenant(name):
@@ -35,8 +54,7 @@ def handle_delete_tenant(tenant_id):
 
 
 def handle_upload_files(tenant_id, files):
-    upload_knowledge_base(tenant_id, files)
-    refresh_tenant_data()
+    st.session_state.pending_jobs.extend(upload_knowledge_base(tenant_id, files))
 
 
 def handle_delete_file(tenant_id, file_id):
@@ -66,6 +84,8 @@ def main():
         for tenant in st.session_state.tenants_data:
             st.button(tenant['name'], use_container_width=True, on_click=set_current_tenant,
                       args=[tenant['name'], tenant['id']])
+        if st.session_state.tenants_cursor is not None:
+            st.button("Show more tenants", use_container_width=True, on_click=load_more_tenants)
 
     if not st.session_state.tenants_data:
         st.warning("Please select or create a tenant to continue.")
@@ -104,19 +124,11 @@ def chat_interface_fragment():
         st.session_state.chat_history.append({"role": "human", "content": prompt})
         messages.chat_message(name="human").write(prompt)
 
-        # Query the index
-        with st.toast("Thinking..."):
-            response = {"response": query_knowledge_base(st.session_state.current_tenant_id, prompt)}
-
-        if "error" not in response:
-            # Add AI response to chat history and display it
-            ai_message = response.get("response", "Sorry, I couldn't generate a response.")
-            st.session_state.chat_history.append({"role": "ai", "content": ai_message})
-            messages.chat_message(name="ai").write(ai_message)
-        else:
-            error_message = f"Error: {response['error']}"
-            st.session_state.chat_history.append({"role": "ai", "content": error_message})
-            messages.chat_message(name="ai").write(error_message)
+        # Query the index, rendering the answer as it streams in
+        ai_message = messages.chat_message(name="ai").write_stream(
+            query_knowledge_base(st.session_state.current_tenant_id, prompt))
+        st.session_state.chat_history.append(
+            {"role": "ai", "content": ai_message or "Sorry, I couldn't generate a response."})
 
 
 @st.fragment
@@ -133,14 +145,52 @@ def knowledge_fragment():
             with col2:
                 st.button("Delete", type='primary', key=file, on_click=handle_delete_file,
                           args=[st.session_state.current_tenant_id, file["id"]])
+        if st.session_state.tenant_files_cursor is not None:
+            st.button("Show more files", on_click=load_more_files, args=[st.session_state.current_tenant_id])
 
     upload_files = st.file_uploader("Upload new knowledge base files",
                                     type=["pdf"],
                                     accept_multiple_files=True, )
 
-    if upload_files:
-        st.button("**Update knowledge config**", type='primary', on_click=handle_upload_files,
-                  args=[st.session_state.current_tenant_id, upload_files])
+    # handled inline rather than in a callback so the upload progress renders in this fragment
+    if upload_files and st.button("**Update knowledge config**", type='primary'):
+        handle_upload_files(st.session_state.current_tenant_id, upload_files)
+
+    if st.session_state.pending_jobs:
+        poll_ingest_jobs()
+
+
+def poll_ingest_jobs():
+    """Show progress for queued uploads, rerunning only this fragment until they finish."""
+    running = []
+    for job in st.session_state.pending_jobs:
+        status = get_job(job["id"])
+        if status is None:
+            # a transient error, the job stays pending and is fetched again on the next poll
+            running.append(job)
+            st.progress(0.0, text=f"{job['filename']}: status unavailable, retrying")
+        elif status["status"] == "succeeded":
+            result = status["result"]
+            if result.get("duplicate"):
+                st.toast(f"File {job['filename']} was already uploaded.")
+            else:
+                st.toast(f"File {job['filename']} processed successfully: {result['embedded_chunks']} chunks "
+                         f"embedded, {result['reused_chunks']} reused.")
+        elif status["status"] == "failed":
+            st.toast(f"Error processing file {job['filename']}: {status['error']}", icon="🚨")
+        else:
+            running.append(job)
+            fraction, text = describe_job_progress(status)
+            st.progress(fraction, text=f"{job['filename']}: {text}")
+
+    finished = len(running) < len(st.session_state.pending_jobs)
+    st.session_state.pending_jobs = running
+    if finished:
+        refresh_tenant_data()
+    if running:
+        time.sleep(JOB_POLL_INTERVAL)
+    if running or finished:
+        st.rerun(scope="fragment")
 
 
 if __name__ == "__main__":
@@ -1,81 +1,138 @@
 import re
-import os
-from typing import Text, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Text, List, Optional, Any, Iterator, Tuple
 import requests
 import streamlit as st
+from api_client import get_client
 
-API_URL = os.getenv("API_URL")
+PAGE_SIZE = 100
+UPLOAD_BATCH_SIZE = 10
+UPLOAD_CONCURRENCY = 4
 
 
 def set_current_tenant(tenant_name: Text, tenant_id: Text) -> None:
     st.session_state.current_tenant = tenant_name
     st.session_state.current_tenant_id = tenant_id
-    st.session_state.tenant_files = get_tenant_files(tenant_id)
+    st.session_state.tenant_files, st.session_state.tenant_files_cursor = get_tenant_files(tenant_id)
     st.session_state.chat_history = []
 
 
 def create_tenant(tenant_name: Text) -> None:
     try:
-        response = requests.post(f"{API_URL}/tenants", json={"name": tenant_name})
-        response.raise_for_status()
+        tenant = get_client().create_tenant(tenant_name)
         st.toast("Tenant created successfully!")
-        set_current_tenant(tenant_name, response.json()["id"])
+        set_current_tenant(tenant_name, tenant["id"])
     except requests.exceptions.RequestException as e:
         st.toast(f"Error creating tenant: {e}", icon="🚨")
 
 
 def delete_tenant(tenant_id: Text) -> None:
     try:
-        response = requests.delete(f"{API_URL}/tenants/{tenant_id}")
-        response.raise_for_status()
+        get_client().delete_tenant(tenant_id)
         st.toast("Tenant deleted successfully!")
     except requests.exceptions.RequestException as e:
         st.toast(f"Error deleting tenant: {e}", icon="🚨")
 
 
-def get_tenants() -> Optional[Any]:
+def get_tenants(after: Optional[int] = None) -> Tuple[List[Any], Optional[int]]:
+    """Fetch a page of tenants and the cursor of the next page, if any."""
     try:
-        response = requests.get(f"{API_URL}/tenants")
-        response.raise_for_status()
-        tenants_data = response.json()
-        return tenants_data if tenants_data else []
+        page = get_client().get_tenants(after, PAGE_SIZE, fields=("id", "name"))
+        return page["tenants"], page["next_cursor"]
     except requests.exceptions.RequestException as e:
         st.toast(f"Error retrieving tenants: {e}", icon="🚨")
+        return [], None
+
+
+def _upload_batches(uploaded_files: List[Any]) -> Iterator[List[Any]]:
+    # at most UPLOAD_BATCH_SIZE files per request, spread so a small selection still uses every worker
+    size = max(1, min(UPLOAD_BATCH_SIZE, -(-len(uploaded_files) // UPLOAD_CONCURRENCY)))
+    for start in range(0, len(uploaded_files), size):
+        yield uploaded_files[start:start + size]
+
+
+def upload_knowledge_base(tenant_id: Text, uploaded_files: List[Any]) -> List[Any]:
+    """Upload files in batches with at most UPLOAD_CONCURRENCY requests in flight and a per-file progress bar,
+    returning the ingest jobs to poll."""
+    jobs, queued = [], set()
+    done = 0
+    progress = st.progress(0.0, text=f"Uploading {len(uploaded_files)} files")
+
+    def advance():
+        nonlocal done
+        done += 1
+        progress.progress(done / len(uploaded_files), text=f"Uploaded {done}/{len(uploaded_files)} files")
+
+    # requests run in the pool, Streamlit calls stay on the script thread
+    with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as executor:
+        futures = {executor.submit(get_client().upload_files, tenant_id, batch): batch
+                   for batch in _upload_batches(uploaded_files)}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                uploads = future.result()["files"]
+            except requests.exceptions.RequestException as e:
+                st.toast(f"Error uploading files {', '.join(file.name for file in batch)}: {e}", icon="🚨")
+                uploads = None
+            except Exception as e:
+                st.toast(f"Unexpected error: {e}", icon="🚨")
+                uploads = None
+            if uploads is None:
+                for _ in batch:
+                    advance()
+                continue
+            for file, upload in zip(batch, uploads):
+                advance()
+                if "error" in upload:
+                    st.toast(f"Error uploading file {file.name}: {upload['error']['detail']}", icon="🚨")
+                    continue
+                # a duplicate shares the job of the copy queued before it
+                if upload["job_id"] is not None and upload["job_id"] not in queued:
+                    queued.add(upload["job_id"])
+                    jobs.append({"id": upload["job_id"], "filename": file.name})
+                st.toast(upload["message"])
+    progress.empty()
+    return jobs
+
+
+def get_job(job_id: Text) -> Optional[Any]:
+    """The job, or None when it could not be fetched this time and should be polled again."""
+    try:
+        return get_client().get_job(job_id)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return {"status": "failed", "error": f"job {job_id} not found"}
+        return None
+    except requests.exceptions.RequestException:
         return None
 
 
-def upload_knowledge_base(tenant_id: Text, uploaded_files: List[Any]) -> None:
-    for file in uploaded_files:
-        try:
-            files = {"file": file}
-            response = requests.post(f"{API_URL}/upload/{tenant_id}", files=files)
-            response.raise_for_status()
-            st.toast(f"File {file.name} uploaded successfully.")
-        except requests.exceptions.RequestException as e:
-            st.toast(f"Error uploading file {file.name}: {e}", icon="🚨")
-        except Exception as e:
-            st.toast(f"Unexpected error: {e}", icon="🚨")
+def describe_job_progress(job: Any) -> Tuple[float, Text]:
+    progress = job["progress"]
+    pages = progress.get("pages_total")
+    if not pages:
+        return 0.0, f"{job['status']}, parsing"
+    chunks = progress.get("chunks_total", 0)
+    fraction = progress.get("pages_parsed", 0) / pages
+    text = (f"{progress.get('pages_parsed', 0)}/{pages} pages parsed, "
+            f"{chunks} chunks stored ({progress.get('chunks_reused', 0)} reused, "
+            f"{progress.get('chunks_embedded', 0)} embedded)")
+    return min(fraction, 1.0), text
 
 
-def get_tenant_files(tenant_id: Text) -> Any:
+def get_tenant_files(tenant_id: Text, after: Optional[int] = None) -> Tuple[List[Any], Optional[int]]:
+    """Fetch a page of the tenant's files and the cursor of the next page, if any."""
     try:
-        response = requests.get(f"{API_URL}/files/{tenant_id}")
-        response.raise_for_status()
-        files_data = response.json()
-        if files_data:
-            return files_data['files']
-        else:
-            st.toast("No files found for this tenant.")
-            return []
+        page = get_client().get_tenant_files(tenant_id, after, PAGE_SIZE, fields=("id", "filename"))
+        return page["files"], page["next_cursor"]
     except requests.exceptions.RequestException as e:
         st.toast(f"Error retrieving files: {e}", icon="🚨")
-        return []
+        return [], None
 
 
 def delete_tenant_files(tenant_id: Text, file_id: Text) -> None:
     try:
-        response = requests.delete(f"{API_URL}/files/{tenant_id}/{file_id}")
-        response.raise_for_status()
+        get_client().delete_file(tenant_id, file_id)
         st.toast(f"File with ID {file_id} deleted successfully.")
     except requests.exceptions.RequestException as e:
         st.toast(f"Error deleting file with ID {file_id}: {e}", icon="🚨")
@@ -83,18 +140,20 @@ def delete_tenant_files(tenant_id: Text, file_id: Text) -> None:
         st.toast(f"Unexpected error: {e}", icon="🚨")
 
 
-def query_knowledge_base(tenant_id: Text, query: Text) -> Any:
+def query_knowledge_base(tenant_id: Text, query: Text) -> Iterator[Text]:
     try:
-        response = requests.post(f"{API_URL}/query/{tenant_id}", json={"text": query, "k": 5})
-        response.raise_for_status()
-        query_results = response.json()
-        return query_results.get("response", "No relevant information found.")
+        for event, data in get_client().stream_query(tenant_id, query):
+            if event == "token":
+                yield data["text"]
+            elif event == "error":
+                st.toast(f"Error querying knowledge base: {data['detail']}", icon="🚨")
+                yield "Error querying knowledge base."
     except requests.exceptions.RequestException as e:
         st.toast(f"Error querying knowledge base: {e}", icon="🚨")
-        return "Error querying knowledge base."
+        yield "Error querying knowledge base."
     except Exception as e:
         st.toast(f"Unexpected error: {e}", icon="🚨")
-        return "Unexpected error occurred."
+        yield "Unexpected error occurred."
 
 
 def add_custom_css():
@@ -0,0 +1,147 @@
+"""Backend API client shared by the admin and user apps.
+
+Requests go through one keep-alive session per process, so Streamlit reruns reuse
+pooled connections instead of opening a new one per call. Tenant and file listings
+are cached for a few seconds and dropped as soon as this client changes them.
+"""
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Iterator, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.getenv("API_URL", "http://localhost:8000/api")
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "10"))
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "120"))
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.5"))
+API_LIST_CACHE_TTL = float(os.getenv("API_LIST_CACHE_TTL", "10"))
+
+FINISHED_JOB_STATUSES = ("succeeded", "failed")
+
+
+def _sse_events(response: requests.Response) -> Iterator[Tuple[str, Any]]:
+    """Parse a server-sent event stream into (event, data) pairs."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+class APIClient:
+    """Pooled client for the backend API; methods raise `requests` exceptions on failure."""
+
+    def __init__(self, base_url: str = API_URL, pool_size: int = API_POOL_SIZE,
+                 timeout: Tuple[float, float] = (API_CONNECT_TIMEOUT, API_READ_TIMEOUT),
+                 retries: int = API_RETRIES, backoff: float = API_RETRY_BACKOFF,
+                 cache_ttl: float = API_LIST_CACHE_TTL):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        # only idempotent methods are retried on gateway errors, any request is retried if it never connected
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(502, 503, 504),
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            # release the pooled connection, streamed responses are otherwise left unread
+            response.close()
+            raise
+        return response
+
+    def _cached_get(self, path: str, params: Dict[str, Any]) -> Any:
+        key = (path, tuple(sorted(params.items())))
+        with self._lock:
+            item = self._cache.get(key)
+            if item is not None and item[0] > time.monotonic():
+                return item[1]
+        data = self._request("GET", path, params=params).json()
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, data)
+        return data
+
+    def invalidate(self, path: str):
+        """Drop cached responses for `path`, whatever their query parameters."""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == path]:
+                del self._cache[key]
+
+    def get_tenants(self, after: Optional[int] = None, limit: Optional[int] = None,
+                    fields: Sequence[str] = ()) -> Any:
+        """A page of tenants: `{"tenants": [...], "next_cursor": ...}`."""
+        return self._cached_get("/tenants", {"after": after, "limit": limit, "fields": ",".join(fields) or None})
+
+    def get_tenant_files(self, tenant_id: Any, after: Optional[int] = None, limit: Optional[int] = None,
+                         fields: Sequence[str] = ()) -> Any:
+        """A page of the tenant's files: `{"files": [...], "next_cursor": ...}`."""
+        return self._cached_get(f"/files/{tenant_id}",
+                                {"after": after, "limit": limit, "fields": ",".join(fields) or None})
+
+    def create_tenant(self, name: str) -> Any:
+        tenant = self._request("POST", "/tenants", json={"name": name}).json()
+        self.invalidate("/tenants")
+        return tenant
+
+    def delete_tenant(self, tenant_id: Any) -> Any:
+        try:
+            return self._request("DELETE", f"/tenants/{tenant_id}").json()
+        finally:
+            self.invalidate("/tenants")
+            self.invalidate(f"/files/{tenant_id}")
+
+    def upload_files(self, tenant_id: Any, files: Sequence[Any]) -> Any:
+        """Upload several files in one request: `{"files": [...]}` with a result per file, in order."""
+        try:
+            return self._request("POST", f"/upload/{tenant_id}/batch",
+                                 files=[("files", file) for file in files]).json()
+        finally:
+            self.invalidate(f"/files/{tenant_id}")
+
+    def delete_file(self, tenant_id: Any, file_id: Any) -> Any:
+        try:
+            return self._request("DELETE", f"/files/{tenant_id}/{file_id}").json()
+        finally:
+            self.invalidate(f"/files/{tenant_id}")
+
+    def get_job(self, job_id: Any) -> Any:
+        """An ingest job; once it has finished the tenant's file listing is refetched."""
+        job = self._request("GET", f"/jobs/{job_id}").json()
+        if job["status"] in FINISHED_JOB_STATUSES:
+            self.invalidate(f"/files/{job['tenant_id']}")
+        return job
+
+    def login(self, username: str, password: str) -> Any:
+        return self._request("POST", "/login", params={"username": username, "password": password}).json()
+
+    def stream_query(self, tenant_id: Any, text: str, k: int = 5) -> Iterator[Tuple[str, Any]]:
+        """Ask a question and yield the server-sent (event, data) pairs of the answer."""
+        with self._request("POST", f"/query/{tenant_id}/stream", json={"text": text, "k": k},
+                           stream=True) as response:
+            yield from _sse_events(response)
+
+
+@lru_cache(maxsize=None)
+def get_client() -> APIClient:
+    """The process-wide client, shared by every Streamlit session."""
+    return APIClient()
@@ -1,7 +1,9 @@
 import streamlit as st
 from streamlit_authenticator import Authenticate
 
-from utils import add_custom_css, footer, query_knowledge_base, load_config, get_tenant_id
+from utils import (
+    add_custom_css, drop_deleted_tenant_cookie, footer, query_knowledge_base, load_config, get_credentials, sign_out
+)
 
 
 @st.cache_data
@@ -10,13 +12,19 @@ def get_cached_config():
 
 
 config = get_cached_config()
+credentials = {'usernames': {}}
 
 authenticator = Authenticate(
-    config['credentials'],
+    credentials,
     config['cookie']['name'],
     config['cookie']['key'],
     config['cookie']['expiry_days'],
 )
+# The authenticator copies a non-empty `usernames` mapping into a plain dict, so the
+# lazy one is swapped in afterwards; it keeps a reference to `credentials`. This and
+# the `cookie_controller` used by utils.sign_out are streamlit-authenticator 0.3.3
+# internals, which is why pyproject.toml pins that version.
+credentials['usernames'] = get_credentials()
 
 
 def initialize_state():
@@ -27,10 +35,16 @@ def initialize_state():
 def main():
     add_custom_css()
     initialize_state()
+    drop_deleted_tenant_cookie(authenticator)
     name, authentication_status, username = authenticator.login(captcha=True)
 
     if authentication_status:
-        st.session_state.user.update({'id': get_tenant_id(username)})
+        tenant = credentials['usernames'].get(username)
+        if tenant is None:
+            # the tenant was deleted while logged in
+            sign_out(authenticator)
+            st.rerun()
+        st.session_state.user.update({'id': tenant['id']})
         chat_interface_fragment()
         footer(authenticator)
     elif authentication_status is False:
@@ -53,17 +67,10 @@ def chat_interface_fragment():
         st.session_state.user['chat_history'].append({"role": "human", "content": prompt})
         messages.chat_message("human").write(prompt)
 
-        with st.toast("Thinking..."):
-            response = {"response": query_knowledge_base(st.session_state.user['id'], prompt)}
-
-        if "error" not in response:
-            ai_message = response.get("response", "Sorry, I couldn't generate a response.")
-            st.session_state.user['chat_history'].append({"role": "ai", "content": ai_message})
-            messages.chat_message("ai").write(ai_message)
-        else:
-            error_message = f"Error: {response['error']}"
-            st.session_state.user['chat_history'].append({"role": "ai", "content": error_message})
-            messages.chat_message("ai").write(error_message)
+        ai_message = messages.chat_message("ai").write_stream(
+            query_knowledge_base(st.session_state.user['id'], prompt))
+        st.session_state.user['chat_history'].append(
+            {"role": "ai", "content": ai_message or "Sorry, I couldn't generate a response."})
 
 
 if __name__ == "__main__":
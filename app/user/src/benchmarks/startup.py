@@ -0,0 +1,61 @@
+"""Compare user-app startup with every tenant hashed up front against lazy credentials.
+
+The tenant API is replaced by an in-memory stub. Hashing all tenants is timed on
+``--sample`` of them and extrapolated, since bcrypt makes the full run take minutes.
+Run from ``app/user``::
+
+    PYTHONPATH=src:../common python -m benchmarks.startup --tenants 10000
+"""
+import argparse
+import time
+
+import streamlit_authenticator as stauth
+
+import utils
+from consts import CREDENTIALS_TTL
+
+
+def install_stub(tenants: dict):
+    utils.get_tenant_id = tenants.get
+
+
+def eager_seconds(names, sample: int) -> float:
+    start = time.perf_counter()
+    for name in names[:sample]:
+        stauth.Hasher([name]).generate()
+    return (time.perf_counter() - start) / sample * len(names)
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def run(n: int, sample: int):
+    names = [f"tenant-{i}" for i in range(n)]
+    tenants = {name: i for i, name in enumerate(names)}
+    install_stub(tenants)
+
+    startup = timed(lambda: (utils.load_config(), utils.TenantCredentials(CREDENTIALS_TTL)))
+    credentials = utils.TenantCredentials(CREDENTIALS_TTL)
+    first_login = timed(lambda: names[-1] in credentials)
+    repeat_login = timed(lambda: names[-1] in credentials)
+    tenants["tenant-new"] = n
+    new_tenant = "tenant-new" in credentials
+
+    print({"tenants": n, "eager_startup_seconds": round(eager_seconds(names, min(sample, n)), 3),
+           "lazy_startup_seconds": round(startup, 6), "first_login_seconds": round(first_login, 3),
+           "cached_login_seconds": round(repeat_login, 6), "new_tenant_found": new_tenant})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=10000)
+    parser.add_argument("--sample", type=int, default=50, help="tenants hashed to extrapolate the eager startup")
+    args = parser.parse_args()
+    run(args.tenants, args.sample)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
 CONFIG_PATH = 'config.yml'
+CREDENTIALS_TTL = 300
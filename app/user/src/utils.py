@@ -1,5 +1,6 @@
-import os
-from typing import Any, Optional
+import threading
+import time
+from typing import Any, Iterator, Optional
 
 import requests
 import streamlit as st
@@ -8,67 +9,123 @@ import yaml
 from streamlit_authenticator import Authenticate
 from yaml.loader import SafeLoader
 
-from consts import CONFIG_PATH
-
-API_URL = os.getenv("API_URL", "http://localhost:8000/api")
+from api_client import get_client
+from consts import CONFIG_PATH, CREDENTIALS_TTL
 
 
 def load_config() -> Any:
     """Load the configuration file."""
     with open(CONFIG_PATH) as file:
-        config = yaml.load(file, Loader=SafeLoader)
-    return add_tenants_to_config(config)
-
-
-def add_tenants_to_config(config: dict) -> dict:
-    """Add tenants to the configuration."""
-    if 'credentials' not in config:
-        config['credentials'] = {}
-    if 'usernames' not in config['credentials']:
-        config['credentials']['usernames'] = {}
-
-    for user in get_tenants() or []:
-        config['credentials']['usernames'][user['name']] = {
-            'name': user['name'],
-            'password': stauth.Hasher([user['name']]).generate()[0]
-        }
-    return config
-
-
-def get_tenants() -> Optional[Any]:
-    """Retrieve tenants from the API."""
-    try:
-        response = requests.get(f"{API_URL}/tenants")
-        response.raise_for_status()
-        return response.json() or []
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching tenants: {e}")
-        return None
+        return yaml.load(file, Loader=SafeLoader)
+
+
+class TenantCredentials(dict):
+    """The authenticator's `usernames` mapping, filled one tenant at a time as they log in.
+
+    A tenant's password is its name, so nothing has to be fetched or hashed up front:
+    the first lookup of a username checks with the API that the tenant exists and
+    bcrypt-hashes it once. Entries expire after `ttl` seconds, so deleted tenants drop
+    out and unknown names are asked about again rather than remembered.
+    """
+
+    def __init__(self, ttl: float):
+        super().__init__()
+        self.ttl = ttl
+        self._expires_at = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, username) -> bool:
+        return self.get(username) is not None
+
+    def get(self, username, default=None):
+        try:
+            return self[username]
+        except KeyError:
+            return default
+
+    def __getitem__(self, username):
+        with self._lock:
+            if self._expires_at.get(username, 0) < time.monotonic():
+                super().pop(username, None)
+                self._expires_at.pop(username, None)
+        return super().__getitem__(username)
+
+    def __missing__(self, username):
+        tenant_id = get_tenant_id(username)
+        if tenant_id is None:
+            raise KeyError(username)
+        entry = {'id': tenant_id, 'name': username, 'password': stauth.Hasher([username]).generate()[0]}
+        with self._lock:
+            now = time.monotonic()
+            for expired in [name for name, expires_at in self._expires_at.items() if expires_at < now]:
+                super().pop(expired, None)
+                del self._expires_at[expired]
+            self._expires_at[username] = now + self.ttl
+            return self.setdefault(username, entry)
+
+
+@st.cache_resource
+def get_credentials() -> TenantCredentials:
+    """Credential cache shared by all sessions."""
+    return TenantCredentials(CREDENTIALS_TTL)
 
 
 def get_tenant_id(tenant_name: str) -> Optional[Any]:
-    """Get tenant ID using their name."""
+    """Get tenant ID using their name, or None if there is no such tenant."""
     try:
-        response = requests.post(f"{API_URL}/login", params={"username": tenant_name, "password": tenant_name})
-        response.raise_for_status()
-        return response.json().get('id')
+        return get_client().login(tenant_name, tenant_name).get('id')
+    except requests.exceptions.HTTPError:
+        return None
     except requests.exceptions.RequestException as e:
         st.error(f"An error occurred: {str(e)}")
         return None
 
 
-def query_knowledge_base(tenant_id: str, query: str) -> Any:
-    """Query the knowledge base for a specific tenant."""
+def sign_out(authenticator: Authenticate):
+    """Log out and drop the re-authentication cookie, also for a tenant deleted since it logged in.
+
+    Authenticate.logout marks the user logged out in `credentials['usernames']`,
+    which raises KeyError once the tenant is gone, so the session is then cleared
+    here and the cookie deleted through the authenticator's `cookie_controller`.
+    """
+    if st.session_state.get('authentication_status'):
+        try:
+            authenticator.logout(location='unrendered')
+            return
+        except KeyError:
+            pass
+    authenticator.cookie_controller.delete_cookie()
+    st.session_state.update(logout=True, name=None, username=None, authentication_status=None)
+
+
+def drop_deleted_tenant_cookie(authenticator: Authenticate):
+    """Sign out a re-authentication cookie whose tenant no longer exists.
+
+    Authenticate.login raises LoginError for a cookie naming an unknown user
+    instead of asking them to log in again.
+    """
+    if st.session_state.get('authentication_status'):
+        return
+    token = authenticator.cookie_controller.get_cookie()
+    if token and token['username'] not in get_credentials():
+        sign_out(authenticator)
+
+
+def query_knowledge_base(tenant_id: str, query: str) -> Iterator[str]:
+    """Stream the answer to a query for a specific tenant, token by token."""
     try:
-        response = requests.post(f"{API_URL}/query/{tenant_id}", json={"text": query, "k": 5})
-        response.raise_for_status()
-        return response.json().get("response", "No relevant information found.")
+        for event, data in get_client().stream_query(tenant_id, query):
+            if event == "token":
+                yield data["text"]
+            elif event == "error":
+                st.error(f"Error querying knowledge base: {data['detail']}")
+                yield f"Error: {data['detail']}"
     except requests.exceptions.RequestException as e:
         st.error(f"Error querying knowledge base: {e}")
-        return {"error": str(e)}
+        yield f"Error: {e}"
     except Exception as e:
         st.error(f"Unexpected error: {e}")
-        return {"error": str(e)}
+        yield f"Error: {e}"
 
 
 def add_custom_css():
@@ -95,7 +152,7 @@ def footer(authenticator: Authenticate):
     )
     st.button(
         "Logout",
-        on_click=lambda: authenticator.logout(location='unrendered'),
+        on_click=lambda: sign_out(authenticator),
         help="Log out of the application",
         type='primary'
     )
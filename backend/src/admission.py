@@ -0,0 +1,231 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Type, TypeVar
+
+from consts import MODEL_CIRCUIT_FAILURES, MODEL_CIRCUIT_RESET, MODEL_QUEUE_TIMEOUT
+from metrics import (
+    MODEL_CALLS_COALESCED, MODEL_CALLS_REJECTED, MODEL_CIRCUIT_OPEN, MODEL_QUEUE_DEPTH, MODEL_QUEUE_WAIT_SECONDS
+)
+
+T = TypeVar("T")
+
+
+class ModelUnavailable(Exception):
+    """A model call was refused before reaching the model; it may be retried after `retry_after` seconds."""
+
+    def __init__(self, model: str, reason: str, retry_after: float):
+        super().__init__(f"{model} is {reason}, retry after {retry_after:.1f}s")
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Hands out `rate` calls per second with bursts of up to `burst`, in arrival order.
+
+    A caller reserves a token up front and is told how long to wait for it, so
+    waiters need no lock or wake-ups and are served first come, first served.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, returning the seconds until it may be used."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self):
+        self.tokens += 1
+
+
+class SingleFlight:
+    """Runs one call per key at a time, sharing its outcome with callers that ask while it is in flight."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Await `fn()`, or the call already in flight for `key`; also returns whether the call was shared."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if not shared:
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda done: self._finish(key, done))
+        # a caller that is cancelled does not cancel the call for the others
+        return await asyncio.shield(call), shared
+
+    def _finish(self, key: Hashable, call: asyncio.Future):
+        self._calls.pop(key, None)
+        if not call.cancelled():
+            # retrieved so an error nobody waited for any more is not logged as unhandled
+            call.exception()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class CircuitBreaker:
+    """Fails calls fast once `threshold` calls in a row have failed.
+
+    After `reset_after` seconds one trial call is let through: if it succeeds the
+    circuit closes, if it fails the circuit stays open for another `reset_after`.
+    """
+
+    def __init__(self, model: str, threshold: int, reset_after: float):
+        self.model = model
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if self._remaining() > 0 or self.trial_running else "half_open"
+
+    def _remaining(self) -> float:
+        return self.opened_at + self.reset_after - time.monotonic()
+
+    def check(self):
+        """Raise ModelUnavailable while the circuit is open, without claiming the trial call."""
+        if self.opened_at is not None and (self._remaining() > 0 or self.trial_running):
+            raise ModelUnavailable(self.model, "unavailable", max(self._remaining(), 1.0))
+
+    def acquire(self) -> bool:
+        """Let a call through or raise ModelUnavailable; returns whether it is the trial of a half-open circuit."""
+        self.check()
+        if self.opened_at is None:
+            return False
+        self.trial_running = True
+        return True
+
+    def release(self, trial: bool, failed: Optional[bool]):
+        """Record how a call ended; `failed` is None when it ended without hearing from the model."""
+        if trial:
+            self.trial_running = False
+        if failed is None:
+            return
+        if failed:
+            self.failures += 1
+            if trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                MODEL_CIRCUIT_OPEN.labels(self.model).set(1)
+        elif trial or self.opened_at is None:
+            # a success of a call sent before the circuit opened does not close it
+            self.failures = 0
+            self.opened_at = None
+            MODEL_CIRCUIT_OPEN.labels(self.model).set(0)
+
+
+class ModelGate:
+    """Admission control for the calls of one process to one model.
+
+    Calls are started at most `rate` per second (0 disables the limit) and one
+    that would wait longer than `max_wait` for its turn is refused. Concurrent
+    calls with the same key share one upstream call. After `failure_threshold`
+    consecutive `trip_on` errors the circuit opens and calls are refused for
+    `reset_after` seconds. Refusals raise ModelUnavailable, served as 503.
+    """
+
+    def __init__(self, model: str, rate: float, burst: int, trip_on: Tuple[Type[BaseException], ...],
+                 max_wait: float = MODEL_QUEUE_TIMEOUT, failure_threshold: int = MODEL_CIRCUIT_FAILURES,
+                 reset_after: float = MODEL_CIRCUIT_RESET):
+        self.model = model
+        self.bucket = TokenBucket(rate, max(burst, 1)) if rate > 0 else None
+        self.max_wait = max_wait
+        self.trip_on = trip_on
+        self.breaker = CircuitBreaker(model, failure_threshold, reset_after)
+        self.flights = SingleFlight()
+        self.queued = 0
+        self.coalesced = 0
+        self.rejected = {"rate_limited": 0, "circuit_open": 0}
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        MODEL_CALLS_REJECTED.labels(self.model, reason).inc()
+
+    async def _wait_turn(self):
+        if self.bucket is None:
+            return
+        wait = self.bucket.reserve()
+        if wait > self.max_wait:
+            self.bucket.refund()
+            self._reject("rate_limited")
+            raise ModelUnavailable(self.model, "rate limited", wait)
+        MODEL_QUEUE_WAIT_SECONDS.labels(self.model).observe(wait)
+        if not wait:
+            return
+        self.queued += 1
+        MODEL_QUEUE_DEPTH.labels(self.model).inc()
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.bucket.refund()
+            raise
+        finally:
+            self.queued -= 1
+            MODEL_QUEUE_DEPTH.labels(self.model).dec()
+
+    def check(self):
+        """Fail fast if the circuit is open, e.g. before committing to a streamed response."""
+        try:
+            self.breaker.check()
+        except ModelUnavailable:
+            self._reject("circuit_open")
+            raise
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Wait for a turn to call the model inside the block, whose errors are counted by the circuit breaker."""
+        try:
+            trial = self.breaker.acquire()
+        except ModelUnavailable:
+            self._reject("circuit_open")
+            raise
+        failed = None
+        try:
+            await self._wait_turn()
+            try:
+                yield
+            except self.trip_on:
+                failed = True
+                raise
+            failed = False
+        finally:
+            self.breaker.release(trial, failed)
+
+    async def call(self, fn: Callable[[], Awaitable[T]], key: Optional[Hashable] = None) -> T:
+        """Await `fn()` once admitted; concurrent calls with the same `key` share one upstream call."""
+        async def admitted():
+            async with self.admit():
+                return await fn()
+
+        if key is None:
+            return await admitted()
+        result, shared = await self.flights.do(key, admitted)
+        if shared:
+            self.coalesced += 1
+            MODEL_CALLS_COALESCED.labels(self.model).inc()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "rate_per_second": self.bucket.rate if self.bucket else None,
+            "queued": self.queued,
+            "in_flight_coalescable": len(self.flights),
+            "coalesced": self.coalesced,
+            "rejected": dict(self.rejected),
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
@@ -0,0 +1,87 @@
+import threading
+from collections import defaultdict
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from cache import LRUCache
+from consts import PROMPT_VERSION, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SEMANTIC_THRESHOLD
+from embeddings import normalize_query
+
+SEMANTIC_CANDIDATES = 32
+
+
+class AnswerCache:
+    """Per-tenant cache of generated answers.
+
+    Entries are keyed on the tenant, the normalized question, ``k``, the ids of
+    the retrieved chunks, the context token budget they were packed into and the
+    prompt version. Each tenant also has a
+    generation number that is bumped whenever its files change, which makes all
+    of its earlier entries unreachable.
+
+    With a ``semantic_threshold``, a question whose embedding is at least that
+    similar to a cached question with the same retrieval key counts as a hit.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, semantic_threshold: Optional[float] = None):
+        self.semantic_threshold = semantic_threshold
+        self._answers = LRUCache(maxsize, ttl)
+        self._similar = LRUCache(maxsize, ttl)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+        self.semantic_hits = 0
+        self.invalidations = 0
+
+    def get(self, tenant_id: int, question: str, k: int, chunk_ids: Sequence[int], context_tokens: int,
+            embedding: Optional[List[float]] = None) -> Optional[str]:
+        retrieval_key = self._retrieval_key(tenant_id, k, chunk_ids, context_tokens)
+        answer = self._answers.get((*retrieval_key, normalize_query(question)))
+        if answer is not None or not self.semantic_threshold or embedding is None:
+            return answer
+
+        candidates = self._similar.get(retrieval_key)
+        if not candidates:
+            return None
+        scores = np.stack([vector for vector, _ in candidates]) @ _unit(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        self.semantic_hits += 1
+        return candidates[best][1]
+
+    def set(self, tenant_id: int, question: str, k: int, chunk_ids: Sequence[int], context_tokens: int, answer: str,
+            embedding: Optional[List[float]] = None):
+        retrieval_key = self._retrieval_key(tenant_id, k, chunk_ids, context_tokens)
+        self._answers.set((*retrieval_key, normalize_query(question)), answer)
+        if self.semantic_threshold and embedding is not None:
+            candidates = self._similar.get(retrieval_key) or []
+            self._similar.set(retrieval_key, [*candidates[-(SEMANTIC_CANDIDATES - 1):], (_unit(embedding), answer)])
+
+    def invalidate_tenant(self, tenant_id: int):
+        with self._lock:
+            self._generations[tenant_id] += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            **self._answers.stats(),
+            "semantic_threshold": self.semantic_threshold,
+            "semantic_hits": self.semantic_hits,
+            "invalidations": self.invalidations,
+        }
+
+    def _retrieval_key(self, tenant_id: int, k: int, chunk_ids: Sequence[int], context_tokens: int) -> tuple:
+        with self._lock:
+            generation = self._generations[tenant_id]
+        # the budget decides which passages are cut short or dropped, so it is part of what the model saw
+        return tenant_id, generation, k, tuple(chunk_ids), context_tokens, PROMPT_VERSION
+
+
+def _unit(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SEMANTIC_THRESHOLD)
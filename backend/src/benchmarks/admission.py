@@ -0,0 +1,114 @@
+"""Show model admission control absorbing a traffic spike and failing fast through an outage.
+
+The spike sends many concurrent /query requests, a few distinct questions
+asked many times over, against fake models limited to `--rate` calls per
+second: duplicates share upstream calls and the rest queue for their turn.
+The outage then makes every generation call fail until the circuit opens,
+after which requests are refused with 503 without reaching the model, and
+checks that the circuit closes again once the model recovers. The database is
+stubbed. Run from ``backend/src``::
+
+    python -m benchmarks.admission --requests 100 --distinct 10 --rate 5
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+import embeddings
+import main as server
+from admission import ModelGate
+from benchmarks import fakes
+from benchmarks.concurrency import StubConnection
+from database import get_conn
+from embeddings import RETRYABLE_ERRORS
+from providers import embedder as configured_embedder
+
+
+def install(args) -> fakes.FakeEmbedder:
+    embedder = fakes.install(server, args.latency, args.latency)
+    embeddings.QUERY_CACHE_PERSISTENT = False
+    gates = [ModelGate(model, args.rate, args.burst, trip_on=RETRYABLE_ERRORS, max_wait=args.max_wait,
+                       failure_threshold=args.failures, reset_after=args.reset)
+             for model in (configured_embedder.name, server.llm.name)]
+    embeddings.embedding_gate = server.embedding_gate = gates[0]
+    server.generation_gate = gates[1]
+
+    async def stub_conn():
+        yield StubConnection(0)
+
+    server.app.dependency_overrides[get_conn] = stub_conn
+    return embedder
+
+
+async def timed_query(client: httpx.AsyncClient, text: str):
+    start = time.perf_counter()
+    response = await client.post("/query/1", json={"text": text, "k": 5})
+    return response, time.perf_counter() - start
+
+
+async def spike(client: httpx.AsyncClient, embedder: fakes.FakeEmbedder, args) -> dict:
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[
+        timed_query(client, f"spike question {i % args.distinct}") for i in range(args.requests)
+    ])
+    elapsed = time.perf_counter() - start
+    latencies = sorted(seconds for _, seconds in outcomes)
+    models = (await client.get("/stats/models")).json()
+    return {
+        "requests": args.requests,
+        "statuses": dict(Counter(response.status_code for response, _ in outcomes)),
+        "seconds": round(elapsed, 3),
+        "p50_seconds": round(latencies[len(latencies) // 2], 3),
+        "max_seconds": round(latencies[-1], 3),
+        "embed_calls": embedder.calls,
+        "llm_calls": server.llm.calls,
+        "max_llm_in_flight": server.llm.max_in_flight,
+        "coalesced": {name: stats["coalesced"] for name, stats in models.items()},
+        "rejected": {name: stats["rejected"] for name, stats in models.items()},
+    }
+
+
+async def outage(client: httpx.AsyncClient, args) -> dict:
+    server.llm.error_rate = 1.0
+    responses = []
+    for i in range(args.failures + 5):
+        response, seconds = await timed_query(client, f"outage question {i}")
+        responses.append({"status": response.status_code, "retry_after": response.headers.get("Retry-After"),
+                          "ms": round(seconds * 1000, 1)})
+    circuit = (await client.get("/stats/models")).json()["generation"]["circuit"]
+
+    server.llm.error_rate = 0.0
+    await asyncio.sleep(args.reset)
+    response, _ = await timed_query(client, "recovery question")
+    recovered = (await client.get("/stats/models")).json()["generation"]["circuit"]
+    return {"responses": responses, "circuit_during_outage": circuit,
+            "status_after_reset": response.status_code, "circuit_after_reset": recovered}
+
+
+async def run(args):
+    embedder = install(args)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        print({"spike": await spike(client, embedder, args)})
+        print({"outage": await outage(client, args)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=10, help="distinct questions among the requests")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds each fake model call takes")
+    parser.add_argument("--rate", type=float, default=5, help="upstream calls per second allowed per model")
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--max-wait", type=float, default=10, help="longest wait for a turn before a 503")
+    parser.add_argument("--failures", type=int, default=3, help="consecutive failures that open the circuit")
+    parser.add_argument("--reset", type=float, default=3, help="seconds the circuit stays open")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
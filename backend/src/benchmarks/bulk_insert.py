@@ -0,0 +1,57 @@
+"""Compare file_chunks write throughput of binary COPY against executemany.
+
+Needs the POSTGRES_* environment of a database created from scripts/init.sql.
+All rows are written in a transaction that is rolled back. Run from
+``backend/src``::
+
+    python -m benchmarks.bulk_insert --rows 5000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from database import queries
+from database.bulk import copy_chunks
+from database.connect import get_db_connection
+from embeddings import content_hash
+
+
+def measure(conn, write, tenant_id, knowledge_base_id, chunks, hashes, embeddings, batch_size) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(chunks), batch_size):
+        batch = slice(i, i + batch_size)
+        write(conn, tenant_id, knowledge_base_id, chunks[batch], hashes[batch], range(len(chunks))[batch],
+              embeddings[batch])
+    return len(chunks) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=768)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    chunks = [f"chunk {i} " + "lorem ipsum " * 80 for i in range(args.rows)]
+    hashes = [content_hash(chunk) for chunk in chunks]
+    embeddings = rng.random((args.rows, args.dimension), dtype=np.float32).tolist()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO tenants (name) VALUES ('bulk_insert_benchmark') RETURNING id")
+            tenant_id = cur.fetchone()[0]
+        knowledge_base_id = queries.insert_knowledge_base(conn, tenant_id, "benchmark.pdf")
+
+        for name, write in (("executemany", queries.insert_chunks), ("binary_copy", copy_chunks)):
+            rate = measure(conn, write, tenant_id, knowledge_base_id, chunks, hashes, embeddings, args.batch_size)
+            print({"path": name, "rows": args.rows, "batch_size": args.batch_size, "rows_per_second": round(rate, 1)})
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
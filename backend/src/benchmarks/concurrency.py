@@ -0,0 +1,113 @@
+"""Check that parallel /query requests overlap instead of queueing on the event loop.
+
+The model and database are replaced by stubs that sleep: the model stubs sleep
+asynchronously like a network call, the database stub blocks its thread like
+psycopg2 does. Run from ``backend/src``::
+
+    python -m benchmarks.concurrency --requests 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import struct
+import time
+
+import httpx
+
+import main as server
+from database import get_conn
+from providers import embedder
+
+STUB_EMBEDDING = struct.pack("!hh", embedder.dimension, 0) + bytes(4 * embedder.dimension)
+
+
+class StubCursor:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, *args):
+        time.sleep(self.latency)
+
+    def fetchall(self):
+        return [{"id": 1, "chunk_content": "stub context", "chunk_index": 0, "file_id": 1, "filename": "stub.pdf",
+                 "similarity": 1.0, "embedding": STUB_EMBEDDING}]
+
+
+class StubConnection:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, cursor_factory=None):
+        return StubCursor(self.latency)
+
+    def close(self):
+        pass
+
+
+class StubResponse:
+    text = "stub answer"
+
+
+class StubModel:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def generate(self, prompt):
+        await asyncio.sleep(self.latency)
+        return StubResponse()
+
+
+def install_stubs(latency: float):
+    async def embed_query(text, conn=None, upstream=None):
+        await asyncio.sleep(latency)
+        return [0.0] * embedder.dimension
+
+    async def stub_conn():
+        yield StubConnection(latency)
+
+    server.embed_query = embed_query
+    server.llm = StubModel(latency)
+    server.app.dependency_overrides[get_conn] = stub_conn
+
+
+async def timed_queries(client: httpx.AsyncClient, n: int) -> float:
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        client.post("/query/1", json={"text": f"question {i}", "k": 5}) for i in range(n)
+    ])
+    elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses), [r.text for r in responses]
+    return elapsed
+
+
+async def run(n: int, latency: float):
+    install_stubs(latency)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        single = await timed_queries(client, 1)
+        parallel = await timed_queries(client, n)
+    print({"requests": n, "single_seconds": round(single, 3), "parallel_seconds": round(parallel, 3),
+           "ratio": round(parallel / single, 2)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds slept by each stubbed stage")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.latency))
+
+
+if __name__ == "__main__":
+    main()
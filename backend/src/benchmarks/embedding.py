@@ -0,0 +1,49 @@
+"""Measure embedding pipeline throughput against a local fake embedder.
+
+Run from ``backend/src``::
+
+    python -m benchmarks.embedding --chunks 2000 --latency 0.2
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from benchmarks.fakes import FakeEmbedder
+from consts import EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY
+from embeddings import embed_chunks
+
+
+async def run(chunks: List[str], batch_size: int, concurrency: int, latency: float) -> dict:
+    embedder = FakeEmbedder(latency)
+    embedded = 0
+    start = time.perf_counter()
+    async for _, batch, _ in embed_chunks(chunks, embedder.embed, batch_size=batch_size, concurrency=concurrency):
+        embedded += len(batch)
+    elapsed = time.perf_counter() - start
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "calls": embedder.calls,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(embedded / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake upstream call")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=EMBEDDING_CONCURRENCY)
+    parser.add_argument("--baseline", action="store_true", help="also run one chunk per call, sequentially")
+    args = parser.parse_args()
+
+    chunks = [f"chunk {i} " * 50 for i in range(args.chunks)]
+    if args.baseline:
+        print(asyncio.run(run(chunks, 1, 1, args.latency)))
+    print(asyncio.run(run(chunks, args.batch_size, args.concurrency, args.latency)))
+
+
+if __name__ == "__main__":
+    main()
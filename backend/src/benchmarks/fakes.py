@@ -0,0 +1,92 @@
+"""Deterministic stand-ins for the embedding and generation providers, with injectable latency and errors."""
+import asyncio
+import random
+from contextlib import contextmanager
+from typing import List
+
+from google.api_core import exceptions as google_exceptions
+
+import providers
+from providers import EmbeddingProvider, GenerationProvider, hashing_embedding
+
+
+class FakeUpstream:
+    """Counts calls and how many overlap, and fails `error_rate` of them as an unavailable service would."""
+
+    def __init__(self, error_rate: float = 0.0, seed: int = 0):
+        self.error_rate = error_rate
+        self.calls = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+
+    @contextmanager
+    def _call(self):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self._random.random() < self.error_rate:
+                self.failures += 1
+                raise google_exceptions.ServiceUnavailable("injected failure")
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+class FakeEmbedder(FakeUpstream, EmbeddingProvider):
+    """Deterministic embedder that simulates the latency of one upstream call per batch."""
+
+    name = "fake-embedder"
+
+    def __init__(self, latency: float = 0.2, dimension: int = providers.embedder.dimension, error_rate: float = 0.0):
+        super().__init__(error_rate)
+        self.latency = latency
+        self.dimension = dimension
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        with self._call():
+            await asyncio.sleep(self.latency)
+            return [hashing_embedding(text, self.dimension) for text in texts]
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeLLM(FakeUpstream, GenerationProvider):
+    """Answers after `latency` seconds, streaming `tokens` tokens `token_interval` seconds apart."""
+
+    name = "fake-llm"
+
+    def __init__(self, latency: float = 0.5, tokens: int = 20, token_interval: float = 0.0, error_rate: float = 0.0):
+        super().__init__(error_rate)
+        self.latency = latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+
+    async def generate(self, prompt: str) -> FakeResponse:
+        with self._call():
+            await asyncio.sleep(self.latency + self.token_interval * self.tokens)
+            return FakeResponse(" ".join(f"token{i}" for i in range(self.tokens)))
+
+    async def stream(self, prompt: str):
+        with self._call():
+            await asyncio.sleep(self.latency)
+            for i in range(self.tokens):
+                yield FakeResponse(f"token{i} ")
+                await asyncio.sleep(self.token_interval)
+
+
+def install(server, embed_latency: float, llm_latency: float, tokens: int = 20,
+            error_rate: float = 0.0) -> FakeEmbedder:
+    """Route the app's model calls to fakes; `server` is the imported ``main`` module.
+
+    The configured embedder keeps its name, so cached and stored embeddings stay keyed as in production.
+    """
+    embedder = FakeEmbedder(embed_latency, error_rate=error_rate)
+    providers.embedder.embed = embedder.embed
+    server.llm = FakeLLM(llm_latency, tokens, error_rate=error_rate)
+    return embedder
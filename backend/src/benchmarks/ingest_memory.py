@@ -0,0 +1,92 @@
+"""Check that peak memory of PDF ingestion does not grow with file size.
+
+Synthetic PDFs of increasing size are streamed through page extraction,
+splitting and embedding (with a fake embedder, no database), and the peak
+Python heap is compared with loading each file eagerly the way ingestion used
+to. Extraction normally runs in worker processes that tracemalloc cannot see,
+so here it runs inline in this process. tests/test_ingest_memory.py checks
+the bound. Run from ``backend/src``::
+
+    python -m benchmarks.ingest_memory --pages 200 800
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import Executor, Future
+
+from pypdf import PdfReader
+
+from benchmarks.fakes import FakeEmbedder
+from benchmarks.pdfs import page_texts, write_pdf
+from consts import INGEST_WINDOW_SIZE
+import documents
+from documents import count_pdf_pages, iter_chunks, iter_pages, text_splitter
+from embeddings import embed_chunks
+
+
+class InlineExecutor(Executor):
+    """Runs each task in the submitting thread, so its allocations are traced with the caller's."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+async def stream(path: str) -> int:
+    embedder = FakeEmbedder(latency=0)
+    chunks = 0
+    pages = await count_pdf_pages(path)
+    async for window in iter_chunks(iter_pages(path, pages), INGEST_WINDOW_SIZE):
+        async for _, batch, _ in embed_chunks(window, embedder.embed):
+            chunks += len(batch)
+    return chunks
+
+
+def eager(path: str) -> int:
+    reader = PdfReader(path)
+    text = "".join(page.extract_text() for page in reader.pages)
+    return len(text_splitter.split_text(text))
+
+
+def peak_mib(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, round(peak / 2 ** 20, 2), round(elapsed, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 800])
+    parser.add_argument("--skip-eager", action="store_true", help="only measure the streaming pipeline")
+    args = parser.parse_args()
+
+    documents._executor = InlineExecutor()
+    peaks = []
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in sorted(args.pages):
+            path = os.path.join(directory, f"{pages}.pdf")
+            write_pdf(path, page_texts(pages))
+            chunks, peak, seconds = peak_mib(lambda: asyncio.run(stream(path)))
+            peaks.append(peak)
+            row = {"pages": pages, "file_mib": round(os.path.getsize(path) / 2 ** 20, 2), "chunks": chunks,
+                   "streaming_peak_mib": peak, "streaming_seconds": seconds}
+            if not args.skip_eager:
+                _, row["eager_peak_mib"], row["eager_seconds"] = peak_mib(eager, path)
+            print(row)
+
+    print({"streaming_peak_ratio": round(peaks[-1] / peaks[0], 2)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class LatencyTracker:
+    """Rolling latency summary over the most recent observations."""
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = np.array(self._samples)
+        if not samples.size:
+            return {"count": self.count}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+        return {
+            "count": self.count,
+            "window": samples.size,
+            "mean_ms": round(float(samples.mean()) * 1000, 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+        }
@@ -0,0 +1,216 @@
+"""Load test ingest and query latency and throughput against fake model providers.
+
+The app runs in-process over ASGI, with ingestion workers as tasks on the same
+event loop, against the Postgres named by the POSTGRES_* environment (the
+docker-compose pgvector service works). Embedding and generation calls go to
+deterministic fakes that sleep for the configured latency, so no API key is
+needed and runs are repeatable. Results are written as JSON so runs on
+different commits can be compared. Run from ``backend/src``::
+
+    python -m benchmarks.load --concurrency 1 4 16 --corpus-docs 10 50 --output load.json
+    python -m benchmarks.load --concurrency 1 4 16 --corpus-docs 10 50 --compare load.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+import httpx
+
+import main as server
+import worker
+from benchmarks import fakes
+from benchmarks.latency import LatencyTracker
+from benchmarks.pdfs import WORDS, page_texts, write_pdf
+from database import get_pool
+
+
+async def drive(requests: int, concurrency: int, request: Callable[[int], Awaitable[None]]) -> dict:
+    """Run `requests` calls of `request` with at most `concurrency` in flight and summarize their latency."""
+    latency = LatencyTracker(window=requests)
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await request(i)
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            latency.observe(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    summary = latency.summary()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round((requests - len(errors)) / elapsed, 2),
+        **{key: summary.get(key) for key in ("mean_ms", "p50_ms", "p95_ms", "p99_ms")},
+    }
+
+
+class Corpus:
+    """Synthetic PDFs with distinct text, so neither file nor chunk dedup skips any work."""
+
+    def __init__(self, directory: str, pages: int, seed: int):
+        self.directory = directory
+        self.pages = pages
+        self.seed = seed
+        self.count = 0
+
+    def next_pdf(self) -> bytes:
+        path = os.path.join(self.directory, f"{self.count}.pdf")
+        write_pdf(path, page_texts(self.pages, seed=self.seed + self.count))
+        self.count += 1
+        with open(path, "rb") as pdf:
+            data = pdf.read()
+        os.remove(path)
+        return data
+
+
+async def ingest(client: httpx.AsyncClient, tenant_id: int, pdf: bytes, poll_interval: float):
+    """Upload one PDF and wait for its ingest job, so latency covers the whole pipeline."""
+    response = await client.post(f"/upload/{tenant_id}", files={"file": ("load.pdf", pdf, "application/pdf")})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        await asyncio.sleep(poll_interval)
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] == "succeeded":
+            return
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"])
+
+
+async def query(client: httpx.AsyncClient, tenant_id: int, rng: random.Random, k: int):
+    # random questions miss the answer and query embedding caches, like distinct users would
+    text = " ".join(rng.choice(WORDS) for _ in range(8)) + f" {rng.random()}"
+    response = await client.post(f"/query/{tenant_id}", json={"text": text, "k": k})
+    response.raise_for_status()
+
+
+async def create_tenant(client: httpx.AsyncClient, name: str) -> int:
+    response = await client.post("/tenants", json={"name": name})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def run(args) -> dict:
+    fakes.install(server, args.embed_latency, args.llm_latency)
+    worker.JOB_POLL_INTERVAL = args.poll_interval
+    run_id = uuid.uuid4().hex[:8]
+    rng = random.Random(args.seed)
+    results = {"ingest": [], "query": []}
+    tenants: List[int] = []
+
+    async with server.lifespan(server.app):
+        workers = [asyncio.create_task(worker.run_worker(get_pool())) for _ in range(args.workers)]
+        transport = httpx.ASGITransport(app=server.app)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                corpus = Corpus(directory, args.pages, args.seed * 1_000_000)
+                async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+                    for concurrency in args.concurrency:
+                        tenant_id = await create_tenant(client, f"load_{run_id}_ingest_{concurrency}")
+                        tenants.append(tenant_id)
+                        pdfs = [corpus.next_pdf() for _ in range(args.ingest_docs)]
+                        row = await drive(args.ingest_docs, concurrency,
+                                          lambda i: ingest(client, tenant_id, pdfs[i], args.poll_interval))
+                        row.update(pages_per_document=args.pages, workers=args.workers)
+                        results["ingest"].append(row)
+                        print({"stage": "ingest", **row})
+
+                    for documents in args.corpus_docs:
+                        tenant_id = await create_tenant(client, f"load_{run_id}_query_{documents}")
+                        tenants.append(tenant_id)
+                        pdfs = [corpus.next_pdf() for _ in range(documents)]
+                        setup = await drive(documents, max(args.workers * 2, 1),
+                                            lambda i: ingest(client, tenant_id, pdfs[i], args.poll_interval))
+                        if setup["errors"]:
+                            raise RuntimeError(f"corpus ingest failed: {setup['first_error']}")
+                        for concurrency in args.concurrency:
+                            row = await drive(args.queries, concurrency, lambda i: query(client, tenant_id, rng, args.k))
+                            row.update(corpus_documents=documents, corpus_pages=documents * args.pages)
+                            results["query"].append(row)
+                            print({"stage": "query", **row})
+
+                    for tenant_id in tenants:
+                        await client.delete(f"/tenants/{tenant_id}")
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, report: dict):
+    """Print latency and throughput of each run relative to the matching run in `baseline`."""
+    for stage in ("ingest", "query"):
+        previous = {(row["concurrency"], row.get("corpus_documents")): row for row in baseline.get(stage, [])}
+        for row in report[stage]:
+            before = previous.get((row["concurrency"], row.get("corpus_documents")))
+            if not before or not before["p95_ms"] or not before["requests_per_second"]:
+                continue
+            print({
+                "stage": stage,
+                "concurrency": row["concurrency"],
+                "corpus_documents": row.get("corpus_documents"),
+                "p95_ratio": round(row["p95_ms"] / before["p95_ms"], 3) if row["p95_ms"] else None,
+                "requests_per_second_ratio": round(row["requests_per_second"] / before["requests_per_second"], 3),
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--ingest-docs", type=int, default=8, help="documents uploaded per ingest concurrency level")
+    parser.add_argument("--corpus-docs", type=int, nargs="+", default=[10, 50], help="corpus sizes for the query runs")
+    parser.add_argument("--pages", type=int, default=10, help="pages per synthetic document")
+    parser.add_argument("--queries", type=int, default=100, help="queries per corpus size and concurrency level")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2, help="in-process ingestion workers")
+    parser.add_argument("--embed-latency", type=float, default=0.1, help="seconds per fake embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake generation call")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="job poll interval of workers and client")
+    parser.add_argument("--seed", type=int, default=int(time.time()))
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "config": vars(args),
+        **asyncio.run(run(args)),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
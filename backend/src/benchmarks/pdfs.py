@@ -0,0 +1,63 @@
+"""Synthetic PDF fixtures for benchmarks."""
+import random
+from typing import Iterable, Iterator
+
+WORDS = ("tenant embedding vector index query answer chunk document page retrieval latency "
+         "throughput cache upload worker pipeline memory budget context token model").split()
+
+LINE_LENGTH = 90
+LINE_HEIGHT = 12
+
+
+def page_texts(pages: int, chars_per_page: int = 3000, seed: int = 0) -> Iterator[str]:
+    rng = random.Random(seed)
+    for _ in range(pages):
+        words, length = [], 0
+        while length < chars_per_page:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        yield " ".join(words)
+
+
+def _content_stream(text: str) -> bytes:
+    lines = [text[i:i + LINE_LENGTH] for i in range(0, len(text), LINE_LENGTH)]
+    body = b" ".join(b"(" + line.encode("latin-1", "replace").translate(None, b"()\\") + b") '" for line in lines)
+    return b"BT /F1 9 Tf 36 806 Td %d TL " % LINE_HEIGHT + body + b" ET"
+
+
+def write_pdf(path: str, texts: Iterable[str]) -> int:
+    """Write a PDF with one Helvetica text page per item, streaming pages to disk.
+
+    Returns the number of pages written.
+    """
+    offsets = []
+
+    with open(path, "wb") as out:
+        def write_object(number: int, body: bytes):
+            offsets.append((number, out.tell()))
+            out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+        out.write(b"%PDF-1.4\n")
+        # 1 is the catalog, 2 the page tree and 3 the font; pages follow as content and page pairs
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        pages = 0
+        for text in texts:
+            content, page = 4 + 2 * pages, 5 + 2 * pages
+            stream = _content_stream(text)
+            write_object(content, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            write_object(page, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                               b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content)
+            pages += 1
+
+        kids = b" ".join(b"%d 0 R" % (5 + 2 * i) for i in range(pages))
+        write_object(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages)
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref = out.tell()
+        size = 4 + 2 * pages
+        entries = dict(offsets)
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        out.writelines(b"%010d 00000 n \n" % entries[number] for number in range(1, size))
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+    return pages
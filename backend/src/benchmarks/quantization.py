@@ -0,0 +1,121 @@
+"""Compare storage, latency and recall@k of the full, halfvec and binary vector index modes.
+
+Needs the POSTGRES_* environment of a database created from scripts/init.sql,
+with pgvector >= 0.7 for the compact modes. Synthetic clustered embeddings are
+loaded into a temporary tenant, the index of every mode is built if missing,
+and each mode's search is compared with exact nearest neighbours computed in
+NumPy. The tenant, and any index this run created, are removed afterwards.
+Run from ``backend/src``::
+
+    python -m benchmarks.quantization --rows 20000 --queries 100 --k 10
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.latency import LatencyTracker
+from database import queries
+from database.bulk import copy_chunks
+from database.connect import get_db_connection
+from vector_index import COMPACT_MIN_PGVECTOR, ensure_index, index_state, pgvector_version
+
+
+def clustered_vectors(rng: np.random.Generator, rows: int, clusters: int, dimension: int) -> np.ndarray:
+    centroids = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centroids[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def load(conn, tenant_id: int, vectors: np.ndarray, batch_size: int = 1000) -> np.ndarray:
+    """Store `vectors` as chunks and return their ids in the same order."""
+    knowledge_base_id = queries.insert_knowledge_base(conn, tenant_id, "quantization.pdf")
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        chunks = [f"synthetic chunk {start + i}" for i in range(len(batch))]
+        copy_chunks(conn, tenant_id, knowledge_base_id, chunks, chunks, range(start, start + len(batch)),
+                    batch.tolist())
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM file_chunks WHERE knowledge_base_id = %s ORDER BY id", (knowledge_base_id,))
+        ids = np.array([row[0] for row in cur.fetchall()])
+    conn.commit()
+    return ids
+
+
+def storage(cur, dimension: int) -> dict:
+    cur.execute(f"""
+        SELECT avg(pg_column_size(embedding))::int,
+               avg(pg_column_size(embedding::halfvec({dimension})))::int,
+               avg(pg_column_size(binary_quantize(embedding)::bit({dimension})))::int
+        FROM (SELECT embedding FROM file_chunks LIMIT 1000) sample
+    """)
+    full, halfvec, binary = cur.fetchone()
+    sizes = {"bytes_per_vector": {"full": full, "halfvec": halfvec, "binary": binary}, "index_mib": {}}
+    for mode, index in queries.VECTOR_INDEXES.items():
+        cur.execute("SELECT pg_relation_size(to_regclass(%s))", (index["name"],))
+        sizes["index_mib"][mode] = round(cur.fetchone()[0] / 2 ** 20, 1)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--keep-indexes", action="store_true", help="keep indexes this run had to build")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    dimension = queries.get_embedding_dimensions(conn)["file_chunks"]
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(rng, args.rows, args.clusters, dimension)
+    probes = vectors[rng.integers(0, args.rows, args.queries)] + 0.3 * rng.standard_normal(
+        (args.queries, dimension)).astype(np.float32)
+    exact = np.argsort(-(probes @ vectors.T), axis=1)[:, :args.k]
+
+    built = []
+    tenant_id = queries.create_tenant(conn, f"quantization_benchmark_{uuid.uuid4().hex[:8]}")["id"]
+    try:
+        with conn.cursor() as cur:
+            if pgvector_version(cur) < COMPACT_MIN_PGVECTOR:
+                raise SystemExit(f"compact modes need pgvector >= {'.'.join(map(str, COMPACT_MIN_PGVECTOR))}")
+        ids = load(conn, tenant_id, vectors)
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for mode, index in queries.VECTOR_INDEXES.items():
+                if index_state(cur, index["name"]) is None:
+                    built.append(index["name"])
+                ensure_index(cur, mode, dimension)
+            cur.execute("ANALYZE file_chunks")
+            print(storage(cur, dimension))
+        conn.autocommit = False
+
+        for mode in queries.VECTOR_INDEXES:
+            latency = LatencyTracker(window=args.queries)
+            recall = []
+            for probe, expected in zip(probes, exact):
+                start = time.perf_counter()
+                results = queries.search_chunks(conn, tenant_id, probe.tolist(), args.k, args.ef_search,
+                                                index_mode=mode)
+                latency.observe(time.perf_counter() - start)
+                recall.append(len({result["id"] for result in results} & set(ids[expected])) / args.k)
+            summary = latency.summary()
+            print({"mode": mode, "rows": args.rows, f"recall@{args.k}": round(float(np.mean(recall)), 3),
+                   "p50_ms": summary["p50_ms"], "p95_ms": summary["p95_ms"]})
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM tenants WHERE id = %s", (tenant_id,))
+            if not args.keep_indexes:
+                for name in built:
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Time MMR reranking of over-fetched candidates at typical sizes.
+
+Run from ``backend/src``::
+
+    python -m benchmarks.rerank --fetch-k 20 50 100 --k 5
+"""
+import argparse
+import struct
+import timeit
+
+import numpy as np
+
+from rerank import mmr, parse_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--files", type=int, default=4, help="distinct files among the candidates")
+    parser.add_argument("--number", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for fetch_k in args.fetch_k:
+        embeddings = rng.standard_normal((fetch_k, args.dimension)).astype(np.float32)
+        relevance = np.sort(rng.random(fetch_k))[::-1]
+        files = [f"file-{i % args.files}.pdf" for i in range(fetch_k)]
+        binary = [struct.pack("!hh", args.dimension, 0) + vector.astype(">f4").tobytes() for vector in embeddings]
+
+        def per_call_us(fn):
+            return round(timeit.timeit(fn, number=args.number) / args.number * 1e6, 1)
+
+        print({
+            "fetch_k": fetch_k,
+            "k": args.k,
+            "mmr_us": per_call_us(lambda: mmr(relevance, embeddings, args.k, 0.7)),
+            "mmr_per_file_cap_us": per_call_us(lambda: mmr(relevance, embeddings, args.k, 0.7, files, 2)),
+            "parse_vectors_us": per_call_us(lambda: parse_vectors(binary)),
+        })
+
+
+if __name__ == "__main__":
+    main()
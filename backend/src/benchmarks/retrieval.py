@@ -0,0 +1,92 @@
+"""Measure recall and latency of vector, lexical and hybrid retrieval on a labelled fixture.
+
+Needs the POSTGRES_* environment of a database created from scripts/init.sql.
+The fixture in ``benchmarks/fixtures/retrieval.json`` is loaded into a
+temporary tenant that is deleted afterwards. Chunks and queries are embedded
+by the configured provider, Gemini by default; EMBEDDING_PROVIDER=hashing
+embeds them locally with no network, but has no notion of synonyms. Run from
+``backend/src``::
+
+    python -m benchmarks.retrieval --k 3 --repeat 20
+    EMBEDDING_PROVIDER=hashing python -m benchmarks.retrieval
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import List
+
+import numpy as np
+
+from benchmarks.latency import LatencyTracker
+from consts import HYBRID_CANDIDATES, RRF_K
+from database import queries
+from database.bulk import copy_chunks
+from database.connect import get_db_connection
+from embeddings import content_hash, embed_batch, embed_query
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "retrieval.json")
+
+
+def load_fixture(conn, tenant_id: int, fixture: dict) -> dict:
+    """Store the fixture's chunks and return a map of chunk id to fixture key."""
+    keys = {}
+    for document in fixture["documents"]:
+        names, chunks = zip(*document["chunks"].items())
+        knowledge_base_id = queries.insert_knowledge_base(conn, tenant_id, document["filename"])
+        copy_chunks(conn, tenant_id, knowledge_base_id, chunks, [content_hash(chunk) for chunk in chunks],
+                    range(len(chunks)), asyncio.run(embed_batch(list(chunks))))
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, chunk_content FROM file_chunks WHERE knowledge_base_id = %s", (knowledge_base_id,))
+            by_content = dict(zip(chunks, names))
+            keys.update({chunk_id: by_content[content] for chunk_id, content in cur.fetchall()})
+    conn.commit()
+    return keys
+
+
+def search(conn, mode: str, tenant_id: int, text: str, embedding: List[float], k: int):
+    if mode == "lexical":
+        return queries.search_chunks_lexical(conn, tenant_id, text, k)
+    if mode == "hybrid":
+        return queries.search_chunks_hybrid(conn, tenant_id, text, embedding, k, max(k, HYBRID_CANDIDATES), RRF_K)
+    return queries.search_chunks(conn, tenant_id, embedding, k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20, help="timed searches per query and mode")
+    args = parser.parse_args()
+
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    questions = [(query["text"], set(query["relevant"]), asyncio.run(embed_query(query["text"])))
+                 for query in fixture["queries"]]
+
+    conn = get_db_connection()
+    tenant_id = queries.create_tenant(conn, f"retrieval_benchmark_{uuid.uuid4().hex[:8]}")["id"]
+    try:
+        keys = load_fixture(conn, tenant_id, fixture)
+        for mode in ("vector", "lexical", "hybrid"):
+            latency = LatencyTracker()
+            recall = []
+            for text, relevant, embedding in questions:
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    results = search(conn, mode, tenant_id, text, embedding, args.k)
+                    latency.observe(time.perf_counter() - start)
+                found = {keys[result["id"]] for result in results}
+                recall.append(len(found & relevant) / len(relevant))
+            summary = latency.summary()
+            print({"mode": mode, "queries": len(questions), f"recall@{args.k}": round(float(np.mean(recall)), 3),
+                   "p50_ms": summary["p50_ms"], "p95_ms": summary["p95_ms"]})
+    finally:
+        conn.rollback()
+        queries.delete_tenant(conn, tenant_id)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
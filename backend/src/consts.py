@@ -1,13 +1,104 @@
+import os
+
 # postgres config
 DB_INIT_FILE = 'database.ini'
 CONFIG = 'config'
 POSTGRES_SECTION = 'postgresql'
 
-# google generative ai config
-EMBEDDING_MODEL = 'models/text-embedding-004'
-LLM = 'models/gemini-1.5-flash-latest'
+# model providers, "gemini" calls the Google AI API with GOOGLE_API_KEY and "hashing" embeds locally on the CPU,
+# for offline ingest and benchmarks. EMBEDDING_DIMENSION sets the size of the embeddings where the provider
+# supports it, unset it is the model's own; the vector columns must match, see embedding_schema.py
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'gemini')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'models/text-embedding-004')
+EMBEDDING_DIMENSION = int(os.getenv('EMBEDDING_DIMENSION') or 0) or None
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+LLM = os.getenv('LLM', 'models/gemini-1.5-flash-latest')
+
+# vector index, "halfvec" and "binary" search a compact index and rescore a shortlist of
+# VECTOR_RESCORE_FACTOR times the rows needed exactly; build the index with vector_index.py
+VECTOR_INDEX_MODE = os.getenv('VECTOR_INDEX_MODE', 'full')
+VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', 4))
+
+# embedding pipeline
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 100))
+EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', 4))
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', 3))
+EMBEDDING_RETRY_BACKOFF = float(os.getenv('EMBEDDING_RETRY_BACKOFF', 0.5))
+
+# model admission control, per process: each remote model is called at most *_RATE_LIMIT times a second
+# (0 disables the limit) with bursts of *_RATE_BURST, and a call that would wait more than
+# MODEL_QUEUE_TIMEOUT seconds for its turn is refused. After MODEL_CIRCUIT_FAILURES upstream failures
+# in a row, calls fail fast with 503 for MODEL_CIRCUIT_RESET seconds before one is let through again.
+EMBEDDING_RATE_LIMIT = float(os.getenv('EMBEDDING_RATE_LIMIT', 25))
+EMBEDDING_RATE_BURST = int(os.getenv('EMBEDDING_RATE_BURST', 25))
+LLM_RATE_LIMIT = float(os.getenv('LLM_RATE_LIMIT', 15))
+LLM_RATE_BURST = int(os.getenv('LLM_RATE_BURST', 15))
+MODEL_QUEUE_TIMEOUT = float(os.getenv('MODEL_QUEUE_TIMEOUT', 10))
+MODEL_CIRCUIT_FAILURES = int(os.getenv('MODEL_CIRCUIT_FAILURES', 5))
+MODEL_CIRCUIT_RESET = float(os.getenv('MODEL_CIRCUIT_RESET', 30))
+
+# query embedding cache
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 10000))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 3600))
+QUERY_CACHE_PERSISTENT = os.getenv('QUERY_CACHE_PERSISTENT', 'true').lower() == 'true'
+
+# answer cache, set ANSWER_CACHE_SEMANTIC_THRESHOLD (e.g. 0.95) to also match similar questions
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 5000))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', 86400))
+ANSWER_CACHE_SEMANTIC_THRESHOLD = float(os.getenv('ANSWER_CACHE_SEMANTIC_THRESHOLD', 0)) or None
+
+# retrieval, vector mode returns chunks with their cosine `similarity`; lexical and
+# hybrid modes return a `score` instead. hybrid mode fuses the top HYBRID_CANDIDATES
+# vector and lexical matches with reciprocal rank fusion, 1 / (RRF_K + rank)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'vector')
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 50))
+RRF_K = int(os.getenv('RRF_K', 60))
+
+# MMR reranking of over-fetched candidates, on request only. A request setting mmr_lambda or max_per_file
+# without fetch_k fetches k * MMR_FETCH_FACTOR candidates; MMR_LAMBDA = 1 ranks by relevance only
+MMR_FETCH_FACTOR = int(os.getenv('MMR_FETCH_FACTOR', 4))
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', 0.7))
+
+# list endpoints are paged by id, LIST_PAGE_SIZE rows at a time unless the client asks for up to LIST_MAX_PAGE_SIZE
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', 100))
+LIST_MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', 1000))
+
+# prompt context, retrieved chunks are packed into CONTEXT_TOKEN_BUDGET tokens unless the query sets its own
+# budget; tokens are estimated as CHARS_PER_TOKEN characters each
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 2000))
+CHARS_PER_TOKEN = 4
+
+# batch queries, at most QUERY_BATCH_CONCURRENCY answers of a batch are generated at once
+QUERY_BATCH_MAX_SIZE = int(os.getenv('QUERY_BATCH_MAX_SIZE', 500))
+QUERY_BATCH_CONCURRENCY = int(os.getenv('QUERY_BATCH_CONCURRENCY', 8))
+
+# document processing, pages are extracted PDF_PAGE_BATCH_SIZE at a time and
+# chunks are ingested INGEST_WINDOW_SIZE at a time so memory does not grow with file size
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 1000))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 0))
+PDF_PARSE_WORKERS = int(os.getenv('PDF_PARSE_WORKERS', 2))
+PDF_PAGE_BATCH_SIZE = int(os.getenv('PDF_PAGE_BATCH_SIZE', 64))
+INGEST_WINDOW_SIZE = int(os.getenv('INGEST_WINDOW_SIZE', EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY))
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', '/data/uploads')
+# files of a multi-file upload that are spooled at once
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', 4))
+
+# background ingestion jobs
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', 2))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', 15))
+JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', 120))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+# port of the worker's Prometheus /metrics endpoint, 0 disables it
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 9100))
+
+# deletion, deleted tenants and files are hidden at once and a purge job then removes their
+# chunks PURGE_BATCH_SIZE at a time, one transaction each, pausing PURGE_BATCH_DELAY seconds in between
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 5000))
+PURGE_BATCH_DELAY = float(os.getenv('PURGE_BATCH_DELAY', 0.1))
 
-# RAG setting
+# RAG setting, bump PROMPT_VERSION whenever PROMPT changes so cached answers are not reused
+PROMPT_VERSION = 1
 PROMPT = """You are an assistant for question-answering tasks. 
 Use the following pieces of retrieved context to answer the question. 
 If you don't know the answer, just say that you don't know.
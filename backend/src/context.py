@@ -0,0 +1,59 @@
+from typing import List, Tuple
+
+from consts import CHARS_PER_TOKEN, CHUNK_OVERLAP
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _overlap(previous: str, following: str) -> int:
+    """Length of the longest suffix of `previous`, at most CHUNK_OVERLAP characters, that `following` starts with."""
+    for size in range(min(CHUNK_OVERLAP, len(previous), len(following)), 0, -1):
+        if following.startswith(previous[-size:]):
+            return size
+    return 0
+
+
+def _passages(results: List[dict]) -> List[dict]:
+    """Merge results that are consecutive chunks of one file, ranked by their best-ranked chunk."""
+    passages = []
+    in_file_order = sorted(range(len(results)), key=lambda rank: (
+        results[rank]["file_id"], results[rank]["chunk_index"] is None, results[rank]["chunk_index"] or 0))
+    for rank in in_file_order:
+        result = results[rank]
+        last = passages[-1] if passages else None
+        if (last is not None and last["file_id"] == result["file_id"] and result["chunk_index"] is not None
+                and last["chunk_index"] == result["chunk_index"] - 1):
+            text = result["chunk_content"]
+            overlap = _overlap(last["last_chunk"], text)
+            last["text"] += text[overlap:] if overlap else "\n" + text
+            last.update(chunk_index=result["chunk_index"], last_chunk=text, rank=min(last["rank"], rank))
+            last["ids"].append(result["id"])
+        else:
+            passages.append({"file_id": result["file_id"], "chunk_index": result["chunk_index"], "rank": rank,
+                             "ids": [result["id"]], "text": result["chunk_content"],
+                             "last_chunk": result["chunk_content"]})
+    return sorted(passages, key=lambda passage: passage["rank"])
+
+
+def build_context(results: List[dict], budget: int) -> Tuple[str, List[int]]:
+    """Pack retrieved chunks into at most `budget` estimated tokens of prompt context.
+
+    Consecutive chunks of the same file are merged into one passage with any
+    overlap between them dropped. Passages are added in order of their best
+    chunk's rank, skipping those that no longer fit, and the best passage is
+    truncated if it alone exceeds the budget. Returns the context and the ids
+    of the chunks in it.
+    """
+    passages = _passages(results)
+    texts, ids, used = [], [], 0
+    for passage in passages:
+        tokens = estimate_tokens(passage["text"])
+        if used + tokens <= budget:
+            texts.append(passage["text"])
+            ids.extend(passage["ids"])
+            used += tokens
+    if passages and not texts:
+        texts, ids = [passages[0]["text"][:budget * CHARS_PER_TOKEN]], passages[0]["ids"]
+    return "\n\n".join(texts), ids
@@ -1 +1,2 @@
-from .connect import get_conn
+from .connect import get_conn, get_pool, open_pool, close_pool
+from .executor import run_db, shutdown_db_executor
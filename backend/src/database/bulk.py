@@ -0,0 +1,97 @@
+import struct
+from io import BytesIO
+from typing import Iterable, List, Sequence
+
+import numpy as np
+from psycopg2 import extensions
+
+# https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+COPY_CHUNKS = ("COPY file_chunks (knowledge_base_id, tenant_id, chunk_content, content_hash, chunk_index, embedding) "
+               "FROM STDIN WITH (FORMAT binary)")
+COPY_STAGED_EMBEDDINGS = ("COPY staged_chunk_embeddings (content_hash, model, embedding) "
+                          "FROM STDIN WITH (FORMAT binary)")
+
+
+def _int4(value: int) -> bytes:
+    return struct.pack("!ii", 4, value)
+
+
+def _text(value: str, encoding: str) -> bytes:
+    data = value.encode(encoding)
+    return struct.pack("!i", len(data)) + data
+
+
+def _vectors(embeddings: Sequence[List[float]]) -> List[bytes]:
+    """Encode embeddings as pgvector binary `vector` fields.
+
+    All embeddings are converted to one big-endian float32 array up front and
+    each field copies its slice as-is, which matches pgvector's layout: int16
+    dimension, int16 unused, float32 values.
+    """
+    vectors = np.asarray(embeddings, dtype=">f4")
+    dimension = vectors.shape[1]
+    prefix = struct.pack("!ihh", 4 + 4 * dimension, dimension, 0)
+    return [prefix + vector.tobytes() for vector in vectors]
+
+
+def _copy_buffer(rows: Iterable[Sequence[bytes]]) -> BytesIO:
+    buffer = BytesIO()
+    buffer.write(COPY_HEADER)
+    for fields in rows:
+        buffer.write(struct.pack("!h", len(fields)))
+        for field in fields:
+            buffer.write(field)
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+    return buffer
+
+
+def encode_chunk_rows(tenant_id: int, knowledge_base_id: int, chunks: Sequence[str], hashes: Sequence[str],
+                      chunk_indexes: Sequence[int], embeddings: Sequence[List[float]],
+                      encoding: str = "utf-8") -> BytesIO:
+    """Encode file_chunks rows in Postgres binary COPY format."""
+    ids = _int4(knowledge_base_id), _int4(tenant_id)
+    return _copy_buffer(
+        (*ids, _text(chunk, encoding), _text(content_hash, encoding), _int4(chunk_index), vector)
+        for chunk, content_hash, chunk_index, vector in zip(chunks, hashes, chunk_indexes, _vectors(embeddings))
+    )
+
+
+def copy_chunks(conn, tenant_id, knowledge_base_id, chunks, hashes, chunk_indexes, embeddings):
+    """Bulk load a batch of chunks with binary COPY without committing."""
+    encoding = extensions.encodings[conn.encoding]
+    with conn.cursor() as cur:
+        cur.copy_expert(COPY_CHUNKS, encode_chunk_rows(tenant_id, knowledge_base_id, chunks, hashes, chunk_indexes,
+                                                       embeddings, encoding))
+
+
+def copy_chunk_embeddings(conn, model, hashes, embeddings):
+    """Add embeddings to the content-addressed store and commit.
+
+    The store is shared by every upload, so it is merged in its own short
+    transaction rather than the file's: concurrent uploads of the same chunks
+    then neither wait on each other's conflict locks until a whole file is
+    done nor deadlock, and each sees what the others stored. Rows are merged
+    in hash order, and since COPY cannot skip conflicts they are staged in a
+    session temp table and merged with ON CONFLICT DO NOTHING.
+    """
+    encoding = extensions.encodings[conn.encoding]
+    model_field = _text(model, encoding)
+    rows = sorted(zip(hashes, _vectors(embeddings)))
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS staged_chunk_embeddings
+            (LIKE chunk_embeddings INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+        """)
+        cur.copy_expert(COPY_STAGED_EMBEDDINGS, _copy_buffer(
+            (_text(content_hash, encoding), model_field, vector) for content_hash, vector in rows
+        ))
+        cur.execute("""
+            INSERT INTO chunk_embeddings (content_hash, model, embedding)
+            SELECT content_hash, model, embedding FROM staged_chunk_embeddings
+            ORDER BY content_hash
+            ON CONFLICT (content_hash) DO NOTHING
+        """)
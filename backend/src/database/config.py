@@ -9,3 +9,12 @@ def db_config():
         "user": os.getenv('POSTGRES_USER'),
         "password": os.getenv('POSTGRES_PASSWORD'),
     }
+
+
+def pool_config():
+    return {
+        "minconn": int(os.getenv('POSTGRES_POOL_MIN', 1)),
+        "maxconn": int(os.getenv('POSTGRES_POOL_MAX', 10)),
+        "timeout": float(os.getenv('POSTGRES_POOL_TIMEOUT', 5)),
+        "health_check_interval": float(os.getenv('POSTGRES_POOL_HEALTH_CHECK_INTERVAL', 30)),
+    }
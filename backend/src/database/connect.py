@@ -1,7 +1,13 @@
+from typing import Optional
+
 import psycopg2
 from fastapi import HTTPException
 
-from .config import db_config
+from .config import db_config, pool_config
+from .executor import run_db
+from .pool import ConnectionPool, PoolTimeout
+
+_pool: Optional[ConnectionPool] = None
 
 
 def get_db_connection():
@@ -14,9 +20,34 @@ def get_db_connection():
         raise HTTPException(status_code=500, detail="Database connection error")
 
 
+async def open_pool() -> ConnectionPool:
+    global _pool
+    pool = ConnectionPool(get_db_connection, **pool_config())
+    await run_db(pool.open)
+    _pool = pool
+    return pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await run_db(_pool.close)
+        _pool = None
+
+
+def get_pool() -> ConnectionPool:
+    if _pool is None:
+        raise RuntimeError("Database pool is not open")
+    return _pool
+
+
 async def get_conn():
-    conn = get_db_connection()
+    pool = get_pool()
+    try:
+        conn = await pool.acquire()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     try:
         yield conn
     finally:
-        conn.close()
+        await pool.release(conn)
@@ -0,0 +1,19 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .config import pool_config
+
+# psycopg2 is blocking, so all database work runs on a dedicated thread pool
+# and never on the event loop. One thread per pooled connection is enough
+# because a request only ever runs one statement at a time.
+_executor = ThreadPoolExecutor(max_workers=pool_config()['maxconn'], thread_name_prefix='db')
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_db_executor():
+    _executor.shutdown(wait=True)
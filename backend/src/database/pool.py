@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+from .executor import run_db
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Process-wide psycopg2 connection pool for async callers.
+
+    Capacity is gated with an asyncio semaphore, so waiting for a free slot
+    happens on the event loop and never ties up a database executor thread.
+    Connections that have been idle for longer than ``health_check_interval``
+    are pinged before being handed out and replaced if they are broken.
+    """
+
+    def __init__(self, connect: Callable, minconn: int, maxconn: int, timeout: float,
+                 health_check_interval: float):
+        self.connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._slots = asyncio.Semaphore(maxconn)
+        self._idle: List[Tuple[extensions.connection, float]] = []
+        self._lock = threading.Lock()
+        self._size = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_seconds = 0.0
+
+    def open(self):
+        for _ in range(self.minconn):
+            conn = self.connect()
+            with self._lock:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            conn.close()
+
+    async def acquire(self) -> extensions.connection:
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        finally:
+            self._waiting -= 1
+        self._wait_seconds += time.monotonic() - start
+        # the checkout thread keeps running if this task is cancelled, so it is shielded
+        # and whatever connection it checks out is handed back once it finishes
+        checkout = asyncio.ensure_future(run_db(self._checkout))
+        try:
+            conn = await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            checkout.add_done_callback(self._return_abandoned)
+            raise
+        except BaseException:
+            self._slots.release()
+            raise
+        self._acquired += 1
+        return conn
+
+    def _return_abandoned(self, checkout: asyncio.Future):
+        if checkout.cancelled() or checkout.exception() is not None:
+            self._slots.release()
+        else:
+            asyncio.ensure_future(self.release(checkout.result()))
+
+    async def release(self, conn: extensions.connection):
+        try:
+            await run_db(self._checkin, conn)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[extensions.connection]:
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size, idle = self._size, len(self._idle)
+        return {
+            "min_size": self.minconn,
+            "max_size": self.maxconn,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "waiting": self._waiting,
+            "acquired_total": self._acquired,
+            "timeouts_total": self._timeouts,
+            "discarded_total": self._discarded,
+            "avg_wait_ms": round(1000 * self._wait_seconds / self._acquired, 3) if self._acquired else 0.0,
+        }
+
+    def _checkout(self) -> extensions.connection:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, idle_since = self._idle.pop()
+            if self._healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+        conn = self.connect()
+        with self._lock:
+            self._size += 1
+        return conn
+
+    def _checkin(self, conn: extensions.connection):
+        if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        if conn.closed or conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            self._discard(conn)
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def _healthy(self, conn: extensions.connection, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: extensions.connection):
+        with self._lock:
+            self._size -= 1
+            self._discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
@@ -0,0 +1,551 @@
+import json
+
+from psycopg2.extras import Json, RealDictCursor, execute_values
+
+from consts import VECTOR_INDEX_MODE, VECTOR_RESCORE_FACTOR
+
+JOB_COLUMNS = "id, kind, tenant_id, status, attempts, payload, progress, result, error, created_at, started_at, finished_at"
+# columns the list endpoints can select, listings are paged by id so it is always included
+TENANT_FIELDS = ("id", "name", "created_at")
+FILE_FIELDS = ("id", "filename", "file_hash", "created_at")
+
+
+def create_tenant(conn, name):
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("INSERT INTO tenants (name) VALUES (%s) RETURNING id, name", (name,))
+        return cur.fetchone()
+
+
+def get_live_tenant(conn, tenant_id):
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id FROM tenants WHERE id = %s AND deleted_at IS NULL", (tenant_id,))
+        return cur.fetchone()
+
+
+def get_tenant_by_name(conn, name):
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id FROM tenants WHERE name = %s AND deleted_at IS NULL", (name,))
+        return cur.fetchone()
+
+
+def get_tenants(conn, fields=TENANT_FIELDS, after=None, limit=None):
+    """Tenants in id order starting after the id `after`, with only the given columns."""
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT {', '.join(fields)} FROM tenants
+            WHERE id > %s AND deleted_at IS NULL
+            ORDER BY id
+            LIMIT %s
+        """, (after or 0, limit))
+        return cur.fetchall()
+
+
+def delete_tenant(conn, tenant_id):
+    """Hide a tenant and its files and queue the job that purges them, in one transaction."""
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("UPDATE tenants SET deleted_at = now() WHERE id = %s AND deleted_at IS NULL RETURNING id",
+                    (tenant_id,))
+        deleted = cur.fetchone()
+        if deleted is None:
+            return None
+        cur.execute("UPDATE knowledge_base SET deleted_at = now() WHERE tenant_id = %s AND deleted_at IS NULL",
+                    (tenant_id,))
+        # the job is not tied to the tenant, whose final delete would cascade to it
+        deleted['job_id'] = _insert_job(cur, 'purge', None, {"tenant_id": tenant_id})['id']
+        return deleted
+
+
+def insert_knowledge_base(conn, tenant_id, filename, file_hash=None):
+    """Insert a file record without committing, so its chunks can join the same transaction."""
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            "INSERT INTO knowledge_base (tenant_id, filename, file_hash) VALUES (%s, %s, %s) RETURNING id",
+            (tenant_id, filename, file_hash)
+        )
+        return cur.fetchone()['id']
+
+
+def insert_chunks(conn, tenant_id, knowledge_base_id, chunks, hashes, chunk_indexes, embeddings):
+    """Insert a batch of chunks row by row without committing."""
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO file_chunks "
+            "(knowledge_base_id, tenant_id, chunk_content, content_hash, chunk_index, embedding) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [(knowledge_base_id, tenant_id, chunk, content_hash, chunk_index, embedding)
+             for chunk, content_hash, chunk_index, embedding in zip(chunks, hashes, chunk_indexes, embeddings)]
+        )
+
+
+def find_duplicate_uploads(conn, tenant_id, file_hashes):
+    """Map each of `file_hashes` that has a stored file or an unfinished ingest job to their ids."""
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT * FROM (
+                SELECT
+                    h.file_hash,
+                    (SELECT id FROM knowledge_base
+                     WHERE tenant_id = %(tenant_id)s AND file_hash = h.file_hash AND deleted_at IS NULL) AS file_id,
+                    (SELECT id FROM jobs
+                     WHERE kind = 'ingest' AND status IN ('queued', 'running')
+                       AND tenant_id = %(tenant_id)s AND payload->>'file_hash' = h.file_hash
+                     ORDER BY id LIMIT 1) AS job_id
+                FROM unnest(%(file_hashes)s::text[]) AS h(file_hash)
+            ) uploads
+            WHERE file_id IS NOT NULL OR job_id IS NOT NULL
+        """, {"tenant_id": tenant_id, "file_hashes": list(file_hashes)})
+        return {row.pop('file_hash'): row for row in cur.fetchall()}
+
+
+def find_duplicate_upload(conn, tenant_id, file_hash):
+    """Find a stored file or an unfinished ingest job for the same file content."""
+    return find_duplicate_uploads(conn, tenant_id, [file_hash]).get(file_hash)
+
+
+def get_file_by_hash(conn, tenant_id, file_hash):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id FROM knowledge_base WHERE tenant_id = %s AND file_hash = %s AND deleted_at IS NULL",
+                    (tenant_id, file_hash))
+        return cur.fetchone()
+
+
+def get_known_chunk_hashes(conn, hashes):
+    with conn.cursor() as cur:
+        cur.execute("SELECT content_hash FROM chunk_embeddings WHERE content_hash = ANY(%s)", (list(hashes),))
+        return {row[0] for row in cur.fetchall()}
+
+
+def insert_reused_chunks(conn, tenant_id, knowledge_base_id, chunks, hashes, chunk_indexes):
+    """Insert chunks whose embeddings are already stored, copying them server-side without committing."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO file_chunks (knowledge_base_id, tenant_id, chunk_content, content_hash, chunk_index, embedding)
+            SELECT %s, %s, c.chunk_content, c.content_hash, c.chunk_index, ce.embedding
+            FROM unnest(%s::text[], %s::text[], %s::int[]) AS c(chunk_content, content_hash, chunk_index)
+            JOIN chunk_embeddings ce ON ce.content_hash = c.content_hash
+        """, (knowledge_base_id, tenant_id, list(chunks), list(hashes), list(chunk_indexes)))
+        return cur.rowcount
+
+
+def _embedding_column(with_embeddings):
+    # pgvector's binary form is decoded with NumPy far faster than its text form is parsed
+    return ", vector_send(fc.embedding) AS embedding" if with_embeddings else ""
+
+
+# HNSW indexes per VECTOR_INDEX_MODE. The compact modes index a half-precision
+# or binary-quantized copy of each embedding, search it for a shortlist of
+# VECTOR_RESCORE_FACTOR times the rows needed, and rescore that shortlist
+# against the full-precision vectors. Their expressions name the embedding
+# size, filled in as {dimension}: the size of the embedding column, which is
+# also that of every query vector searched with them.
+VECTOR_INDEXES = {
+    "full": {
+        "name": "file_chunks_embedding_idx",
+        "definition": "hnsw (embedding vector_cosine_ops)",
+    },
+    "halfvec": {
+        "name": "file_chunks_embedding_halfvec_idx",
+        "definition": "hnsw ((embedding::halfvec({dimension})) halfvec_cosine_ops)",
+        "order_by": "embedding::halfvec({dimension}) <=> ({query})::halfvec({dimension})",
+    },
+    "binary": {
+        "name": "file_chunks_embedding_binary_idx",
+        "definition": "hnsw ((binary_quantize(embedding)::bit({dimension})) bit_hamming_ops)",
+        "order_by": "binary_quantize(embedding)::bit({dimension}) <~> binary_quantize({query})",
+    },
+}
+HNSW_DEFAULT_EF_SEARCH = 40
+
+
+def _live(column):
+    """SQL filtering out chunks of soft-deleted files, which are kept until their purge job removes them.
+
+    Only files awaiting a purge are looked up, through a small partial index,
+    and each candidate row is checked against them with a hashed NOT IN.
+    """
+    return f"""{column} NOT IN (
+        SELECT id FROM knowledge_base WHERE tenant_id = %(tenant_id)s AND deleted_at IS NOT NULL
+    )"""
+
+
+def _nearest_chunks(index_mode, dimension, query="%(embedding)s::vector"):
+    """SQL for the ids and exact cosine distances of a tenant's %(limit)s nearest chunks to the vector `query`."""
+    if index_mode == "full":
+        # Ordering by the selected distance lets the HNSW index serve the sort
+        # while the query vector is only sent once.
+        return f"""
+            SELECT id, embedding <=> {query} AS distance
+            FROM file_chunks
+            WHERE tenant_id = %(tenant_id)s AND {_live("knowledge_base_id")}
+            ORDER BY distance
+            LIMIT %(limit)s
+        """
+    return f"""
+        SELECT id, embedding <=> {query} AS distance
+        FROM (
+            SELECT id, embedding
+            FROM file_chunks
+            WHERE tenant_id = %(tenant_id)s AND {_live("knowledge_base_id")}
+            ORDER BY {VECTOR_INDEXES[index_mode]['order_by'].format(query=query, dimension=dimension)}
+            LIMIT %(shortlist)s
+        ) shortlist
+        ORDER BY distance
+        LIMIT %(limit)s
+    """
+
+
+def _set_ef_search(cur, ef_search, index_mode, limit):
+    # An HNSW scan returns at most ef_search rows, so it must cover the rows the query needs
+    needed = limit * VECTOR_RESCORE_FACTOR if index_mode != "full" else limit
+    if ef_search or needed > HNSW_DEFAULT_EF_SEARCH:
+        cur.execute("SET LOCAL hnsw.ef_search = %s", (min(max(ef_search or HNSW_DEFAULT_EF_SEARCH, needed), 1000),))
+
+
+def search_chunks(conn, tenant_id, query_embedding, k, ef_search=None, with_embeddings=False, index_mode=None):
+    index_mode = index_mode or VECTOR_INDEX_MODE
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        _set_ef_search(cur, ef_search, index_mode, k)
+        cur.execute(f"""
+            SELECT fc.id, fc.chunk_content, fc.chunk_index, kb.id AS file_id,
+                   kb.filename{_embedding_column(with_embeddings)}, 1 - nearest.distance AS similarity
+            FROM ({_nearest_chunks(index_mode, len(query_embedding))}) nearest
+            JOIN file_chunks fc ON fc.id = nearest.id
+            JOIN knowledge_base kb ON fc.knowledge_base_id = kb.id
+            ORDER BY nearest.distance
+        """, {"embedding": query_embedding, "tenant_id": tenant_id, "limit": k,
+              "shortlist": k * VECTOR_RESCORE_FACTOR})
+        return cur.fetchall()
+
+
+# Matches chunks sharing any lexeme with the query, rather than all of them as
+# plainto_tsquery would, so natural-language questions still find exact identifiers.
+# Each lexeme is turned into a tsquery with plainto_tsquery, whose text output is
+# valid tsquery input whatever quotes or backslashes the lexeme holds, and the
+# terms are joined with | and cast back.
+def _lexical_query(text="%(text)s"):
+    return f"""
+        SELECT coalesce(string_agg('(' || term::text || ')', ' | '), '')::tsquery AS query
+        FROM unnest(tsvector_to_array(to_tsvector('english', {text}))) AS lexeme,
+             LATERAL plainto_tsquery('simple', lexeme) AS term
+        WHERE numnode(term) > 0
+    """
+
+
+def _lexical_chunks(limit, text="%(text)s"):
+    """SQL for the ids and ts_rank_cd scores of a tenant's `limit` best full-text matches for `text`."""
+    return f"""
+        SELECT fc.id, ts_rank_cd(fc.content_tsv, lexical.query) AS score
+        FROM file_chunks fc, ({_lexical_query(text)}) lexical
+        WHERE fc.tenant_id = %(tenant_id)s AND fc.content_tsv @@ lexical.query AND {_live("fc.knowledge_base_id")}
+        ORDER BY score DESC
+        LIMIT {limit}
+    """
+
+
+def _fused_chunks(index_mode, dimension, text="%(text)s", query="%(embedding)s::vector"):
+    """SQL for the ids and reciprocal rank fusion scores of the top %(k)s of both searches."""
+    return f"""
+        WITH vector_hits AS (
+            SELECT id, row_number() OVER (ORDER BY distance) AS rank
+            FROM ({_nearest_chunks(index_mode, dimension, query)}) nearest
+        ),
+        lexical_hits AS (
+            SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+            FROM ({_lexical_chunks("%(candidates)s", text)}) matched
+        )
+        SELECT id, sum(1.0 / (%(rrf_k)s + rank)) AS score
+        FROM (SELECT * FROM vector_hits UNION ALL SELECT * FROM lexical_hits) hits
+        GROUP BY id
+        ORDER BY score DESC
+        LIMIT %(k)s
+    """
+
+
+def search_chunks_lexical(conn, tenant_id, query_text, k, with_embeddings=False):
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT fc.id, fc.chunk_content, fc.chunk_index, kb.id AS file_id,
+                   kb.filename{_embedding_column(with_embeddings)}, matched.score
+            FROM ({_lexical_chunks("%(k)s")}) matched
+            JOIN file_chunks fc ON fc.id = matched.id
+            JOIN knowledge_base kb ON fc.knowledge_base_id = kb.id
+            ORDER BY matched.score DESC
+        """, {"text": query_text, "tenant_id": tenant_id, "k": k})
+        return cur.fetchall()
+
+
+def search_chunks_hybrid(conn, tenant_id, query_text, query_embedding, k, candidates, rrf_k, ef_search=None,
+                         with_embeddings=False, index_mode=None):
+    """Fuse the top `candidates` of the HNSW and GIN indexes with reciprocal rank fusion."""
+    index_mode = index_mode or VECTOR_INDEX_MODE
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        _set_ef_search(cur, ef_search, index_mode, candidates)
+        cur.execute(f"""
+            SELECT fc.id, fc.chunk_content, fc.chunk_index, kb.id AS file_id,
+                   kb.filename{_embedding_column(with_embeddings)}, fused.score::float AS score
+            FROM ({_fused_chunks(index_mode, len(query_embedding))}) fused
+            JOIN file_chunks fc ON fc.id = fused.id
+            JOIN knowledge_base kb ON fc.knowledge_base_id = kb.id
+            ORDER BY fused.score DESC
+        """, {"text": query_text, "embedding": query_embedding, "tenant_id": tenant_id, "candidates": candidates,
+              "limit": candidates, "shortlist": candidates * VECTOR_RESCORE_FACTOR, "rrf_k": rrf_k, "k": k})
+        return cur.fetchall()
+
+
+def search_chunks_batch(conn, tenant_id, mode, query_texts, query_embeddings, k, candidates, rrf_k, ef_search=None,
+                        with_embeddings=False, index_mode=None):
+    """Run the `mode` search for every query in one statement and return each query's results in order.
+
+    Each query's search is a LATERAL subquery over the unnested query texts and
+    vectors, so it is planned against the same indexes as a single search.
+    `query_embeddings` is ignored in lexical mode.
+    """
+    index_mode = index_mode or VECTOR_INDEX_MODE
+    if mode == "vector":
+        matches = _nearest_chunks(index_mode, len(query_embeddings[0]), "q.embedding")
+        score, order = "1 - matches.distance AS similarity", "matches.distance"
+    elif mode == "lexical":
+        matches = _lexical_chunks("%(k)s", "q.text")
+        score, order = "matches.score", "matches.score DESC"
+    else:
+        matches = _fused_chunks(index_mode, len(query_embeddings[0]), "q.text", "q.embedding")
+        score, order = "matches.score::float AS score", "matches.score DESC"
+    limit = k if mode == "vector" else candidates
+    # vectors are sent in pgvector's text form, psycopg2 would send a list of lists as a two-dimensional array
+    embeddings = [str(list(embedding)) for embedding in query_embeddings] if mode != "lexical" else None
+
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if mode != "lexical":
+            _set_ef_search(cur, ef_search, index_mode, limit)
+        cur.execute(f"""
+            SELECT q.ord AS query_index, fc.id, fc.chunk_content, fc.chunk_index, kb.id AS file_id,
+                   kb.filename{_embedding_column(with_embeddings)}, {score}
+            FROM unnest(%(texts)s::text[], %(embeddings)s::vector[]) WITH ORDINALITY AS q(text, embedding, ord)
+            CROSS JOIN LATERAL ({matches}) matches
+            JOIN file_chunks fc ON fc.id = matches.id
+            JOIN knowledge_base kb ON fc.knowledge_base_id = kb.id
+            ORDER BY q.ord, {order}
+        """, {"texts": list(query_texts), "embeddings": embeddings or [None] * len(query_texts),
+              "tenant_id": tenant_id, "candidates": candidates, "limit": limit,
+              "shortlist": limit * VECTOR_RESCORE_FACTOR, "rrf_k": rrf_k, "k": k})
+        results = [[] for _ in query_texts]
+        for row in cur.fetchall():
+            results[row.pop("query_index") - 1].append(row)
+        return results
+
+
+def list_files(conn, tenant_id, fields=FILE_FIELDS, after=None, limit=None):
+    """A tenant's files in id order starting after the id `after`, served by the (tenant_id, id) index."""
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT {', '.join(fields)}
+            FROM knowledge_base
+            WHERE tenant_id = %s AND id > %s AND deleted_at IS NULL
+            ORDER BY id
+            LIMIT %s
+        """, (tenant_id, after or 0, limit))
+        return cur.fetchall()
+
+
+def delete_file(conn, tenant_id, file_id):
+    """Hide a file and queue the job that purges it, in one transaction."""
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            UPDATE knowledge_base SET deleted_at = now()
+            WHERE tenant_id = %s AND id = %s AND deleted_at IS NULL
+            RETURNING id
+        """, (tenant_id, file_id))
+        deleted = cur.fetchone()
+        if deleted is not None:
+            deleted['job_id'] = _insert_job(cur, 'purge', tenant_id, {"file_id": file_id})['id']
+        return deleted
+
+
+def _chunk_owner(tenant_id, file_id):
+    return ("knowledge_base_id", file_id) if file_id is not None else ("tenant_id", tenant_id)
+
+
+def count_chunks(conn, tenant_id=None, file_id=None):
+    column, value = _chunk_owner(tenant_id, file_id)
+    with conn, conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM file_chunks WHERE {column} = %s", (value,))
+        return cur.fetchone()[0]
+
+
+def purge_chunks(conn, limit, tenant_id=None, file_id=None):
+    """Delete up to `limit` chunks of a tenant or file in their own transaction, returning how many were deleted."""
+    column, value = _chunk_owner(tenant_id, file_id)
+    with conn, conn.cursor() as cur:
+        cur.execute(f"""
+            DELETE FROM file_chunks
+            WHERE id IN (SELECT id FROM file_chunks WHERE {column} = %s LIMIT %s)
+        """, (value, limit))
+        return cur.rowcount
+
+
+def purge_deleted(conn, tenant_id=None, file_id=None):
+    """Remove a soft-deleted tenant or file once its chunks are purged; a tenant takes its files and jobs along."""
+    with conn, conn.cursor() as cur:
+        if file_id is not None:
+            cur.execute("DELETE FROM knowledge_base WHERE id = %s AND deleted_at IS NOT NULL", (file_id,))
+        else:
+            cur.execute("DELETE FROM tenants WHERE id = %s AND deleted_at IS NOT NULL", (tenant_id,))
+
+
+def get_cached_query_embedding(conn, model, query_hash):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT embedding FROM query_embedding_cache WHERE model = %s AND query_hash = %s",
+            (model, query_hash)
+        )
+        row = cur.fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def store_cached_query_embedding(conn, model, query_hash, embedding):
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO query_embedding_cache (model, query_hash, embedding) VALUES (%s, %s, %s)
+            ON CONFLICT (model, query_hash) DO NOTHING
+        """, (model, query_hash, embedding))
+
+
+def get_cached_query_embeddings(conn, model, query_hashes):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT query_hash, embedding FROM query_embedding_cache WHERE model = %s AND query_hash = ANY(%s)",
+            (model, list(query_hashes))
+        )
+        return {query_hash: json.loads(embedding) for query_hash, embedding in cur.fetchall()}
+
+
+def store_cached_query_embeddings(conn, model, embeddings):
+    """Persist a dict of query hash to embedding in one statement."""
+    with conn, conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO query_embedding_cache (model, query_hash, embedding) VALUES %s
+            ON CONFLICT (model, query_hash) DO NOTHING
+        """, [(model, query_hash, embedding) for query_hash, embedding in embeddings.items()])
+
+
+# tables with a vector(n) embedding column, sized for the embedding provider
+EMBEDDING_TABLES = ("file_chunks", "chunk_embeddings", "query_embedding_cache")
+
+
+def get_embedding_dimensions(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT attrelid::regclass::text, atttypmod FROM pg_attribute
+            WHERE attrelid = ANY(%s::regclass[]) AND attname = 'embedding'
+        """, (list(EMBEDDING_TABLES),))
+        return dict(cur.fetchall())
+
+
+def purge_query_embeddings(conn, keep_model):
+    """Drop persisted query embeddings that were produced by any other model."""
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM query_embedding_cache WHERE model <> %s", (keep_model,))
+        return cur.rowcount
+
+
+def _insert_job(cur, kind, tenant_id, payload):
+    cur.execute(
+        "INSERT INTO jobs (kind, tenant_id, payload) VALUES (%s, %s, %s) RETURNING id, status",
+        (kind, tenant_id, Json(payload))
+    )
+    return cur.fetchone()
+
+
+def _lock_live_tenant(cur, tenant_id):
+    """Share-lock a tenant that is not deleted, so a concurrent delete waits until the transaction commits."""
+    cur.execute("SELECT id FROM tenants WHERE id = %s AND deleted_at IS NULL FOR SHARE", (tenant_id,))
+    return cur.fetchone() is not None
+
+
+def enqueue_job(conn, kind, tenant_id, payload):
+    """Queue a job for a tenant, or return None if the tenant is deleted."""
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if not _lock_live_tenant(cur, tenant_id):
+            return None
+        return _insert_job(cur, kind, tenant_id, payload)
+
+
+def enqueue_jobs(conn, kind, tenant_id, payloads):
+    """Queue one job per payload in a single statement, returning them in the order of `payloads`.
+
+    Returns None if the tenant is deleted.
+    """
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if not _lock_live_tenant(cur, tenant_id):
+            return None
+        cur.execute("""
+            INSERT INTO jobs (kind, tenant_id, payload)
+            SELECT %s, %s, payload FROM unnest(%s::jsonb[]) WITH ORDINALITY AS queued(payload, ord)
+            ORDER BY ord
+            RETURNING id, status
+        """, (kind, tenant_id, [Json(payload) for payload in payloads]))
+        # ids are drawn in insertion order, which RETURNING does not promise to keep
+        return sorted(cur.fetchall(), key=lambda job: job['id'])
+
+
+def claim_job(conn, stale_after, max_attempts):
+    """Claim the oldest queued job, or a running one whose worker stopped sending heartbeats."""
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1, started_at = now(), heartbeat_at = now()
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'queued' OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => %s)))
+                  AND attempts < %s
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING {JOB_COLUMNS}
+        """, (stale_after, max_attempts))
+        return cur.fetchone()
+
+
+def fail_stale_jobs(conn, stale_after, max_attempts):
+    """Fail running jobs whose worker stopped sending heartbeats on their last attempt, returning their payloads."""
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs
+            SET status = 'failed', error = 'Worker stopped responding on the last attempt', finished_at = now()
+            WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => %s) AND attempts >= %s
+            RETURNING payload
+        """, (stale_after, max_attempts))
+        return [row[0] for row in cur.fetchall()]
+
+
+def update_job_progress(conn, job_id, progress):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE jobs SET progress = progress || %s, heartbeat_at = now() WHERE id = %s",
+            (Json(progress), job_id)
+        )
+
+
+def complete_job(conn, job_id, result):
+    """Mark a job as succeeded and commit, together with any work done on `conn`."""
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE jobs SET status = 'succeeded', result = %s, error = NULL, finished_at = now() WHERE id = %s",
+            (Json(result), job_id)
+        )
+
+
+def fail_job(conn, job_id, error, retry):
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs
+            SET status = %s, error = %s, finished_at = CASE WHEN %s THEN NULL ELSE now() END
+            WHERE id = %s
+        """, ('queued' if retry else 'failed', error, retry, job_id))
+
+
+def get_job(conn, job_id):
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = %s", (job_id,))
+        return cur.fetchone()
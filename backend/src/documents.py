@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Iterator, List, Tuple
+
+from fastapi import UploadFile
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pypdf import PageObject, PdfReader
+from pypdf.generic import DictionaryObject, IndirectObject
+
+from consts import CHUNK_OVERLAP, CHUNK_SIZE, PDF_PAGE_BATCH_SIZE, PDF_PARSE_WORKERS, UPLOAD_DIR
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# page attributes a page takes from its ancestors in the page tree when it does not set them
+INHERITED_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len)
+
+# PDF parsing and splitting are CPU-bound, so they run in worker processes to keep
+# both the event loop and the GIL free for request handling.
+_executor = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+# the file and reader each extraction worker is going through
+_open_pdf = threading.local()
+
+
+async def spool_upload(file: UploadFile) -> Tuple[str, str]:
+    """Copy an upload to UPLOAD_DIR, where ingestion workers pick it up.
+
+    Returns the spooled path and the SHA-256 of the file contents.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.pdf")
+    digest = hashlib.sha256()
+    try:
+        with open(path, "wb") as out:
+            while chunk := await file.read(SPOOL_CHUNK_SIZE):
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def _page_tree(reader: PdfReader) -> DictionaryObject:
+    return reader.trailer["/Root"]["/Pages"]
+
+
+def count_pages(path: str) -> int:
+    """The page count the page tree declares, read without loading any page."""
+    with open(path, "rb") as pdf:
+        reader = PdfReader(pdf)
+        try:
+            return int(_page_tree(reader)["/Count"])
+        finally:
+            reader.resolved_objects.clear()
+
+
+def _forget(reader: PdfReader, reference) -> None:
+    # drop a parsed object from the reader's cache, so skipped and finished pages are not held
+    if isinstance(reference, IndirectObject):
+        reader.resolved_objects.pop((reference.generation, reference.idnum), None)
+
+
+def _page_range(reader: PdfReader, start: int, stop: int) -> Iterator[PageObject]:
+    """Yield pages ``[start, stop)`` by descending the page tree.
+
+    ``reader.pages`` loads every page of the file on first use, so each batch
+    would hold the whole page tree. Here subtrees before `start` are skipped by
+    their /Count, and skipped or yielded pages are dropped from the reader's
+    cache, so a batch only holds its own pages and their ancestors.
+    """
+    position = 0
+
+    def walk(node: DictionaryObject, inherited: dict) -> Iterator[PageObject]:
+        nonlocal position
+        inherited = {**inherited, **{key: value for key, value in node.items() if key in INHERITED_PAGE_ATTRIBUTES}}
+        for reference in node.get("/Kids", []):
+            if position >= stop:
+                return
+            kid = reference.get_object()
+            if kid.get("/Type") == "/Pages" or "/Kids" in kid:
+                if "/Count" in kid and position + int(kid["/Count"]) <= start:
+                    position += int(kid["/Count"])
+                else:
+                    yield from walk(kid, inherited)
+            elif position < start:
+                position += 1
+            else:
+                page = PageObject(reader, reference if isinstance(reference, IndirectObject) else None)
+                page.update(kid)
+                for key, value in inherited.items():
+                    if key not in page:
+                        page[key] = value
+                position += 1
+                yield page
+            _forget(reader, reference)
+
+    yield from walk(_page_tree(reader), {})
+
+
+def _reader(path: str) -> PdfReader:
+    """This worker's reader of `path`, kept open across batches so the file's cross-reference table is read once.
+
+    The reader is given an open file rather than a path, since pypdf reads a
+    path into memory in full but seeks lazily within a file object.
+    """
+    current = getattr(_open_pdf, "current", None)
+    if current is None or current[0] != path:
+        _close_reader()
+        pdf = open(path, "rb")
+        _open_pdf.current = (path, pdf, PdfReader(pdf))
+    return _open_pdf.current[2]
+
+
+def _close_reader():
+    current = getattr(_open_pdf, "current", None)
+    _open_pdf.current = None
+    if current is not None:
+        current[1].close()
+
+
+def extract_pages(path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages ``[start, stop)``.
+
+    Only the page tree's cross-reference table stays in memory between
+    batches; the reader is closed after an error or once the last page is read.
+    """
+    reader = _reader(path)
+    last = False
+    try:
+        texts = [page.extract_text() for page in _page_range(reader, start, stop)]
+        last = stop >= int(_page_tree(reader)["/Count"])
+        return texts
+    except BaseException:
+        last = True
+        raise
+    finally:
+        # parsed objects point back at the reader, so they are dropped rather than left for the cycle collector
+        reader.resolved_objects.clear()
+        if last:
+            _close_reader()
+
+
+async def count_pdf_pages(path: str) -> int:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, count_pages, path)
+
+
+async def iter_pages(path: str, page_count: int, batch_size: int = PDF_PAGE_BATCH_SIZE,
+                     prefetch: int = PDF_PARSE_WORKERS) -> AsyncIterator[str]:
+    """Yield page texts in order, extracting `batch_size` pages per task.
+
+    Up to `prefetch` batches are extracted ahead of the consumer, across the
+    process pool, so only those batches are ever held in memory.
+    """
+    loop = asyncio.get_running_loop()
+    starts = iter(range(0, page_count, batch_size))
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < prefetch and (start := next(starts, None)) is not None:
+                stop = min(start + batch_size, page_count)
+                pending.append(loop.run_in_executor(_executor, extract_pages, path, start, stop))
+            if not pending:
+                return
+            for text in await pending.popleft():
+                yield text
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def iter_chunks(pages: AsyncIterable[str], batch_size: int) -> AsyncIterator[List[str]]:
+    """Split streamed page text into lists of up to `batch_size` chunks.
+
+    The last piece of each split is held back and prefixed to the next page,
+    so chunks span page boundaries as they would if the whole text was split.
+    """
+    batch, tail = [], ""
+    async for text in pages:
+        pieces = text_splitter.split_text(tail + text)
+        tail = pieces.pop() if pieces else ""
+        batch.extend(pieces)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if tail:
+        batch.append(tail)
+    for start in range(0, len(batch), batch_size):
+        yield batch[start:start + batch_size]
+
+
+def shutdown_pdf_executor():
+    _executor.shutdown(wait=True)
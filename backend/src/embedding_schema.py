@@ -0,0 +1,48 @@
+"""Resize the embedding columns to the dimension of the configured embedding provider.
+
+scripts/init.sql creates the columns as vector(768), the size of Gemini's
+text-embedding-004. Vectors cannot be converted to another size, so the
+columns can only be resized while they hold no embeddings: run this on a
+fresh database before ingesting, with the backend's EMBEDDING_* settings.
+The compact vector indexes are dropped with the old size, rebuild the one in
+use with vector_index.py. From ``backend/src``::
+
+    EMBEDDING_PROVIDER=hashing EMBEDDING_DIMENSION=256 python embedding_schema.py
+"""
+import argparse
+import sys
+
+from database.connect import get_db_connection
+from database.queries import EMBEDDING_TABLES, VECTOR_INDEXES, get_embedding_dimensions
+from providers import embedder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only report the current and wanted sizes")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        sizes = get_embedding_dimensions(conn)
+        print({"provider": embedder.name, "dimension": embedder.dimension, "columns": sizes})
+        if all(size == embedder.dimension for size in sizes.values()) or args.dry_run:
+            return
+        with conn, conn.cursor() as cur:
+            for table in EMBEDDING_TABLES:
+                cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE embedding IS NOT NULL)")
+                if cur.fetchone()[0]:
+                    sys.exit(f"{table} already holds embeddings of {sizes[table]} dimensions")
+            for mode, index in VECTOR_INDEXES.items():
+                if mode != "full":
+                    cur.execute(f"DROP INDEX IF EXISTS {index['name']}")
+            for table in EMBEDDING_TABLES:
+                # the full-precision HNSW index on file_chunks is rebuilt along with its column
+                cur.execute(f"ALTER TABLE {table} ALTER COLUMN embedding TYPE vector({embedder.dimension})")
+        print({"columns": get_embedding_dimensions(conn)})
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
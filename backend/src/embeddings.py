@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import random
+from itertools import islice
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from google.api_core import exceptions as google_exceptions
+
+from admission import ModelGate, ModelUnavailable
+from cache import LRUCache
+from consts import (
+    EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY, EMBEDDING_MAX_RETRIES, EMBEDDING_RATE_BURST, EMBEDDING_RATE_LIMIT,
+    EMBEDDING_RETRY_BACKOFF, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_PERSISTENT
+)
+from database import run_db, queries
+from providers import embedder
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+# wraps each awaited upstream call, so callers can report model failures apart from cache I/O
+UpstreamFn = Callable[[Awaitable[List[List[float]]]], Awaitable[List[List[float]]]]
+
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+MODEL_ERRORS = (google_exceptions.GoogleAPIError, *RETRYABLE_ERRORS)
+
+embedding_gate = ModelGate(embedder.name, EMBEDDING_RATE_LIMIT if embedder.remote else 0, EMBEDDING_RATE_BURST,
+                           trip_on=RETRYABLE_ERRORS)
+
+
+async def embed_batch(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of texts with a single upstream call, shared with identical batches in flight."""
+    key = ("batch", hashlib.sha256("\0".join([embedder.name, *texts]).encode()).hexdigest())
+    return await embedding_gate.call(lambda: embedder.embed(texts), key)
+
+
+query_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+persistent_query_cache_stats = {"hits": 0, "misses": 0}
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def query_cache_key(text: str) -> str:
+    return hashlib.sha256(f"{embedder.name}\0{normalize_query(text)}".encode()).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    """Address a chunk's embedding by its exact text and the model that embeds it."""
+    return hashlib.sha256(f"{embedder.name}\0{text}".encode()).hexdigest()
+
+
+async def _direct(call: Awaitable[List[List[float]]]) -> List[List[float]]:
+    return await call
+
+
+async def embed_query(text: str, conn=None, upstream: UpstreamFn = _direct) -> List[float]:
+    """Embed a query, consulting the in-process cache and then the Postgres cache.
+
+    Cache keys include the embedding model, so entries from a previous model are
+    never returned; persisted ones are purged at startup by `purge_stale_query_embeddings`.
+    Only the model call on a miss is awaited through `upstream`.
+    """
+    key = query_cache_key(text)
+    if (embedding := query_cache.get(key)) is not None:
+        return embedding
+
+    persistent = QUERY_CACHE_PERSISTENT and conn is not None
+    if persistent:
+        embedding = await run_db(queries.get_cached_query_embedding, conn, embedder.name, key)
+        if embedding is not None:
+            persistent_query_cache_stats["hits"] += 1
+            query_cache.set(key, embedding)
+            return embedding
+        persistent_query_cache_stats["misses"] += 1
+
+    embedding = (await upstream(embedding_gate.call(lambda: embedder.embed([text]), ("query", key))))[0]
+    query_cache.set(key, embedding)
+    if persistent:
+        await run_db(queries.store_cached_query_embedding, conn, embedder.name, key, embedding)
+    return embedding
+
+
+async def embed_queries(texts: List[str], conn=None, upstream: UpstreamFn = _direct) -> List[List[float]]:
+    """Embed several queries, consulting the same caches as `embed_query` and embedding the misses in batches."""
+    keys = [query_cache_key(text) for text in texts]
+    embeddings = {}
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key in embeddings or key in missing:
+            continue
+        if (embedding := query_cache.get(key)) is not None:
+            embeddings[key] = embedding
+        else:
+            missing[key] = text
+
+    persistent = QUERY_CACHE_PERSISTENT and conn is not None
+    if missing and persistent:
+        stored = await run_db(queries.get_cached_query_embeddings, conn, embedder.name, list(missing))
+        persistent_query_cache_stats["hits"] += len(stored)
+        persistent_query_cache_stats["misses"] += len(missing) - len(stored)
+        for key, embedding in stored.items():
+            query_cache.set(key, embedding)
+            embeddings[key] = embedding
+            del missing[key]
+
+    if missing:
+        missing_keys = list(missing)
+        # a request fails fast, with 503 while the circuit is open, rather than waiting out retries as ingestion does
+        async for offset, batch, batch_embeddings in embed_chunks(list(missing.values()), lambda batch: upstream(embed_batch(batch)),
+                                                                 max_retries=0):
+            for key, embedding in zip(missing_keys[offset:offset + len(batch)], batch_embeddings):
+                query_cache.set(key, embedding)
+                embeddings[key] = embedding
+        if persistent:
+            await run_db(queries.store_cached_query_embeddings, conn, embedder.name,
+                         {key: embeddings[key] for key in missing_keys})
+
+    return [embeddings[key] for key in keys]
+
+
+async def purge_stale_query_embeddings(conn) -> int:
+    if not QUERY_CACHE_PERSISTENT:
+        return 0
+    return await run_db(queries.purge_query_embeddings, conn, embedder.name)
+
+
+async def check_embedding_dimension(conn):
+    """Fail at startup, rather than on the first insert, if the schema stores vectors of another size."""
+    sizes = await run_db(queries.get_embedding_dimensions, conn)
+    mismatched = {table: size for table, size in sizes.items() if size != embedder.dimension}
+    if mismatched:
+        raise RuntimeError(f"{embedder.name} embeddings have {embedder.dimension} dimensions but the embedding "
+                           f"columns have {mismatched}, resize them with embedding_schema.py")
+
+
+def query_cache_stats() -> dict:
+    return {
+        "model": embedder.name,
+        "memory": query_cache.stats(),
+        "persistent": {"enabled": QUERY_CACHE_PERSISTENT, **persistent_query_cache_stats},
+    }
+
+
+async def _embed_with_retry(embed_fn: EmbedFn, offset: int, batch: List[str],
+                            max_retries: int, backoff: float) -> Tuple[int, List[str], List[List[float]]]:
+    attempt = 0
+    while True:
+        try:
+            return offset, batch, await embed_fn(batch)
+        except (*RETRYABLE_ERRORS, ModelUnavailable) as e:
+            if attempt >= max_retries:
+                raise
+            # exponential backoff with full jitter so parallel batches don't retry in lockstep
+            delay = random.uniform(0, backoff * 2 ** attempt)
+            await asyncio.sleep(max(delay, e.retry_after) if isinstance(e, ModelUnavailable) else delay)
+            attempt += 1
+
+
+def _batched(chunks: Iterable[str], batch_size: int) -> Iterable[Tuple[int, List[str]]]:
+    iterator = iter(chunks)
+    offset = 0
+    while batch := list(islice(iterator, batch_size)):
+        yield offset, batch
+        offset += len(batch)
+
+
+async def embed_chunks(
+        chunks: Iterable[str],
+        embed_fn: Optional[EmbedFn] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        backoff: float = EMBEDDING_RETRY_BACKOFF,
+) -> AsyncIterator[Tuple[int, List[str], List[List[float]]]]:
+    """Embed chunks in batches with at most `concurrency` batches in flight.
+
+    Yields ``(offset, batch, embeddings)`` as soon as each batch completes, so
+    results may arrive out of order; ``offset`` is the index of the batch's
+    first chunk in the input.
+    """
+    embed_fn = embed_fn or embed_batch
+    batches = _batched(chunks, batch_size)
+    pending = set()
+    try:
+        while True:
+            while len(pending) < concurrency and (item := next(batches, None)) is not None:
+                offset, batch = item
+                pending.add(asyncio.create_task(_embed_with_retry(embed_fn, offset, batch, max_retries, backoff)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,105 @@
+from collections import defaultdict
+from typing import Awaitable, Callable, List
+
+from consts import INGEST_WINDOW_SIZE
+from database import run_db, queries
+from database.pool import ConnectionPool
+from database.bulk import copy_chunk_embeddings, copy_chunks
+from documents import count_pdf_pages, iter_chunks, iter_pages
+from embeddings import MODEL_ERRORS, content_hash, embed_chunks
+from metrics import UPSTREAM_ERRORS, Timings, timed
+from providers import embedder
+
+ProgressFn = Callable[..., Awaitable[None]]
+
+
+async def ingest_file(pool: ConnectionPool, conn, tenant_id: int, filename: str, path: str, file_hash: str,
+                      report: ProgressFn, timings: Timings) -> dict:
+    """Parse, split, embed and store one PDF on `conn` without committing.
+
+    Pages stream through the splitter and are ingested INGEST_WINDOW_SIZE chunks
+    at a time, so memory stays flat however large the file is. Chunks whose
+    embedding is already in the content-addressed store are copied from it, and
+    each distinct new chunk is embedded once. New embeddings are committed to
+    the shared store on a separate connection from `pool` as they arrive. `report` is awaited with keyword
+    progress counters after each window, and the time of each stage is added
+    to `timings`.
+    """
+    with timings.stage("dedup"):
+        duplicate = await run_db(queries.get_file_by_hash, conn, tenant_id, file_hash)
+    if duplicate:
+        return {"knowledge_base_id": duplicate['id'], "duplicate": True}
+
+    with timings.stage("parse"):
+        page_count = await count_pdf_pages(path)
+    await report(pages_total=page_count)
+
+    knowledge_base_id = None
+    pages_parsed = 0
+
+    async def pages():
+        nonlocal pages_parsed
+        async for text in timed(iter_pages(path, page_count), timings, "parse"):
+            pages_parsed += 1
+            yield text
+
+    totals = {"chunks_total": 0, "chunks_reused": 0, "chunks_embedded": 0, "rows_written": 0}
+    async for window in timed(iter_chunks(pages(), INGEST_WINDOW_SIZE), timings, "split"):
+        if knowledge_base_id is None:
+            with timings.stage("insert"):
+                knowledge_base_id = await run_db(queries.insert_knowledge_base, conn, tenant_id, filename, file_hash)
+        reused, embedded = await _ingest_window(pool, conn, tenant_id, knowledge_base_id, totals["chunks_total"],
+                                                window, timings)
+        totals["chunks_total"] += len(window)
+        totals["chunks_reused"] += reused
+        totals["chunks_embedded"] += embedded
+        totals["rows_written"] += len(window)
+        await report(pages_parsed=pages_parsed, **totals)
+
+    return {
+        "knowledge_base_id": knowledge_base_id,
+        "chunks": totals["chunks_total"],
+        "reused_chunks": totals["chunks_reused"],
+        "embedded_chunks": totals["chunks_embedded"],
+    }
+
+
+async def _ingest_window(pool: ConnectionPool, conn, tenant_id: int, knowledge_base_id: int, offset: int, chunks: List[str],
+                         timings: Timings):
+    """Store one window of chunks starting at chunk `offset` of the file, and return how many were reused and embedded.
+
+    Embeddings stored by earlier windows, or by other uploads in flight, are
+    already committed, so a chunk seen before is reused rather than re-embedded.
+    """
+    with timings.stage("dedup"):
+        hashes = [content_hash(chunk) for chunk in chunks]
+        known = await run_db(queries.get_known_chunk_hashes, conn, set(hashes))
+    if known:
+        reused = [position for position, h in enumerate(hashes) if h in known]
+        with timings.stage("insert"):
+            await run_db(queries.insert_reused_chunks, conn, tenant_id, knowledge_base_id,
+                         [chunks[position] for position in reused], [hashes[position] for position in reused],
+                         [offset + position for position in reused])
+
+    positions = defaultdict(list)
+    for position, h in enumerate(hashes):
+        if h not in known:
+            positions[h].append(position)
+    new_hashes = list(positions)
+
+    batches = embed_chunks([chunks[positions[h][0]] for h in new_hashes])
+    try:
+        async for batch_offset, batch, embeddings in timed(batches, timings, "embed"):
+            batch_hashes = new_hashes[batch_offset:batch_offset + len(batch)]
+            rows = [(chunks[position], h, offset + position, embedding)
+                    for h, embedding in zip(batch_hashes, embeddings) for position in positions[h]]
+            with timings.stage("insert"):
+                async with pool.connection() as store:
+                    await run_db(copy_chunk_embeddings, store, embedder.name, batch_hashes, embeddings)
+                await run_db(copy_chunks, conn, tenant_id, knowledge_base_id, [row[0] for row in rows],
+                             [row[1] for row in rows], [row[2] for row in rows], [row[3] for row in rows])
+    except MODEL_ERRORS:
+        UPSTREAM_ERRORS.labels(str(tenant_id), "embed").inc()
+        raise
+
+    return len(chunks) - len(new_hashes), len(new_hashes)
@@ -1,43 +1,61 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
-from psycopg2.extras import RealDictCursor
-import google.generativeai as genai
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from io import BytesIO
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+import hashlib
+import json
+import math
+import time
+from typing import Awaitable, List, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Response, Query as QueryParam
+from fastapi.responses import StreamingResponse
 import os
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from pypdf import PdfReader
+from admission import ModelGate, ModelUnavailable
+from answer_cache import answer_cache
+from consts import (
+    HYBRID_CANDIDATES, LIST_MAX_PAGE_SIZE, LIST_PAGE_SIZE, LLM_PROVIDER, LLM_RATE_BURST, LLM_RATE_LIMIT,
+    MMR_FETCH_FACTOR, PROMPT, QUERY_BATCH_CONCURRENCY, RRF_K, UPLOAD_CONCURRENCY
+)
+from models import BatchQuery, RetrievalOptions, Tenant, Query
+from database import get_conn, get_pool, open_pool, close_pool, run_db, shutdown_db_executor, queries
+from context import build_context, estimate_tokens
+from documents import spool_upload, shutdown_pdf_executor
+from embeddings import (
+    RETRYABLE_ERRORS, check_embedding_dimension, embed_queries, embed_query, embedding_gate,
+    purge_stale_query_embeddings, query_cache_stats
+)
+from metrics import PROMPT_TOKENS, TIME_TO_FIRST_TOKEN, UPSTREAM_ERRORS, Timings
+from providers import create_generation_provider
+from rerank import rerank
 
-from consts import EMBEDDING_MODEL, LLM, PROMPT
-from models import Tenant, Query
-from database import get_conn
 
-app = FastAPI(root_path="/api")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool = await open_pool()
+    async with pool.connection() as conn:
+        await check_embedding_dimension(conn)
+        await purge_stale_query_embeddings(conn)
+    yield
+    await close_pool()
+    shutdown_pdf_executor()
+    shutdown_db_executor()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-llm = genai.GenerativeModel(
-    model_name=LLM,
-    safety_settings={
-        'HATE': 'BLOCK_NONE',
-        'HARASSMENT': 'BLOCK_NONE',
-        'SEXUAL': 'BLOCK_NONE',
-        'DANGEROUS': 'BLOCK_NONE'
-    }
-)
+app = FastAPI(root_path="/api", lifespan=lifespan)
 
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=0, length_function=len)
+llm = create_generation_provider(LLM_PROVIDER)
+generation_gate = ModelGate(llm.name, LLM_RATE_LIMIT, LLM_RATE_BURST, trip_on=RETRYABLE_ERRORS)
+
+T = TypeVar("T")
 
 
 @app.post("/tenants")
 async def create_tenant(tenant: Tenant, conn=Depends(get_conn)):
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("INSERT INTO tenants (name) VALUES (%s) RETURNING id, name", (tenant.name,))
-            new_tenant = cur.fetchone()
-            conn.commit()
-        return new_tenant
+        return await run_db(queries.create_tenant, conn, tenant.name)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
@@ -45,152 +63,531 @@ async def create_tenant(tenant: Tenant, conn=Depends(get_conn)):
 async def login(username: str, password: str, conn=Depends(get_conn)):
     try:
         if username == password:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id FROM tenants WHERE name = %s", (username,))
-                tenant = cur.fetchone()
+            tenant = await run_db(queries.get_tenant_by_name, conn, username)
 
             if tenant:
                 return {"id": tenant['id']}
 
         raise HTTPException(status_code=400, detail="Invalid username or password")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+def select_fields(fields: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """Parse a comma-separated `fields` parameter; `id` is always selected since it is the page cursor."""
+    if not fields:
+        return list(allowed)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(allowed)}")
+    return list(dict.fromkeys(["id", *selected]))
+
+
+def page(rows, limit: int) -> tuple:
+    """Split rows fetched with one extra row into a page and the cursor of the next one."""
+    return rows[:limit], rows[limit - 1]['id'] if len(rows) > limit else None
+
+
 @app.get("/tenants")
-async def get_tenants(conn=Depends(get_conn)):
+async def get_tenants(after: Optional[int] = None, limit: int = QueryParam(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+                      fields: Optional[str] = None, conn=Depends(get_conn)):
+    """List tenants by id, `limit` at a time; pass `next_cursor` back as `after` for the next page."""
+    columns = select_fields(fields, queries.TENANT_FIELDS)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT id, name FROM tenants")
-            tenants = cur.fetchall()
-        return tenants
+        tenants, next_cursor = page(await run_db(queries.get_tenants, conn, columns, after, limit + 1), limit)
+        return {"tenants": tenants, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
-@app.delete("/tenants/{tenant_id}")
+@app.delete("/tenants/{tenant_id}", status_code=202)
 async def delete_tenant(tenant_id: int, conn=Depends(get_conn)):
+    """Hide the tenant at once; its files and chunks are purged by the returned job."""
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("DELETE FROM tenants WHERE id = %s RETURNING id", (tenant_id,))
-            deleted = cur.fetchone()
-            conn.commit()
+        deleted = await run_db(queries.delete_tenant, conn, tenant_id)
         if deleted:
-            return {"message": f"Tenant with ID {deleted['id']} deleted successfully"}
+            answer_cache.invalidate_tenant(tenant_id)
+            return {"message": f"Tenant with ID {deleted['id']} deleted successfully", "job_id": deleted['job_id']}
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+async def require_live_tenant(tenant_id: int, conn):
+    """Refuse uploads for a tenant that does not exist or is being purged."""
+    if not await run_db(queries.get_live_tenant, conn, tenant_id):
         raise HTTPException(status_code=404, detail="Tenant not found")
+
+
+@app.post("/upload/{tenant_id}", status_code=202)
+async def upload_file(tenant_id: int, response: Response, file: UploadFile = File(...), conn=Depends(get_conn)):
+    """Spool the file and queue it for ingestion; poll /jobs/{job_id} for progress.
+
+    Re-uploading a file the tenant already has, or has queued, returns the
+    existing file or job instead of queuing it again. Parsing, splitting,
+    embedding and inserting are timed by the worker.
+    """
+    timings = Timings("upload")
+    try:
+        await require_live_tenant(tenant_id, conn)
+        with timings.stage("read"):
+            path, file_hash = await spool_upload(file)
+        try:
+            with timings.stage("dedup"):
+                duplicate = await run_db(queries.find_duplicate_upload, conn, tenant_id, file_hash)
+            if duplicate:
+                os.remove(path)
+                response.status_code = 200
+                return {"job_id": duplicate['job_id'], "file_id": duplicate['file_id'], "duplicate": True,
+                        "message": f"File {file.filename} was already uploaded."}
+
+            with timings.stage("enqueue"):
+                job = await run_db(queries.enqueue_job, conn, 'ingest', tenant_id,
+                                   {"filename": file.filename, "path": path, "file_hash": file_hash})
+            if job is None:
+                raise HTTPException(status_code=404, detail="Tenant not found")
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        return {"job_id": job['id'], "status": job['status'], "duplicate": False,
+                "message": f"File {file.filename} queued for processing."}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        timings.observe()
+        response.headers["Server-Timing"] = timings.server_timing()
+
+
+@app.post("/upload/{tenant_id}/batch", status_code=202)
+async def upload_files(tenant_id: int, response: Response, files: List[UploadFile] = File(...),
+                       conn=Depends(get_conn)):
+    """Spool several files concurrently and queue each for ingestion, with one result per file in request order.
+
+    Files are spooled UPLOAD_CONCURRENCY at a time, then duplicates are looked
+    up and jobs queued with one query each. A file that repeats one already
+    stored, queued, or earlier in the request is reported as a duplicate, and
+    a file that fails to spool gets an `error` without failing the others.
+    """
+    timings = Timings("upload_batch")
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def spool(file):
+        async with semaphore:
+            return await spool_upload(file)
+
+    results = [{"filename": file.filename} for file in files]
+    spooled = {}
+    queued = None
+    try:
+        await require_live_tenant(tenant_id, conn)
+        with timings.stage("read"):
+            for position, outcome in enumerate(await asyncio.gather(*[spool(file) for file in files],
+                                                                    return_exceptions=True)):
+                if isinstance(outcome, Exception):
+                    results[position]["error"] = {"status_code": 500, "detail": f"Error processing file: {outcome}"}
+                else:
+                    spooled[position] = outcome
+
+        with timings.stage("dedup"):
+            duplicates = await run_db(queries.find_duplicate_uploads, conn, tenant_id,
+                                      {file_hash for _, file_hash in spooled.values()})
+        first = {}
+        for position, (path, file_hash) in spooled.items():
+            if file_hash in duplicates or file_hash in first:
+                os.remove(path)
+            else:
+                first[file_hash] = position
+
+        with timings.stage("enqueue"):
+            jobs = await run_db(queries.enqueue_jobs, conn, 'ingest', tenant_id, [
+                {"filename": files[position].filename, "path": spooled[position][0], "file_hash": file_hash}
+                for file_hash, position in first.items()
+            ]) if first else []
+        if jobs is None:
+            raise HTTPException(status_code=404, detail="Tenant not found")
+        queued = {file_hash: job for file_hash, job in zip(first, jobs)}
+
+        for position, (_, file_hash) in spooled.items():
+            filename = files[position].filename
+            if first.get(file_hash) == position:
+                job = queued[file_hash]
+                results[position].update(job_id=job['id'], status=job['status'], duplicate=False,
+                                         message=f"File {filename} queued for processing.")
+            else:
+                duplicate = duplicates.get(file_hash) or {"job_id": queued[file_hash]['id'], "file_id": None}
+                results[position].update(job_id=duplicate['job_id'], file_id=duplicate['file_id'], duplicate=True,
+                                         message=f"File {filename} was already uploaded.")
+        return {"files": results}
+
+    except Exception as e:
+        if queued is None:
+            for path, _ in spooled.values():
+                if os.path.exists(path):
+                    os.remove(path)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Error processing files: {str(e)}")
+    finally:
+        timings.observe()
+        response.headers["Server-Timing"] = timings.server_timing()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int, conn=Depends(get_conn)):
+    try:
+        job = await run_db(queries.get_job, conn, job_id)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
-@app.post("/upload/{tenant_id}")
-async def upload_file(tenant_id: int, file: UploadFile = File(...), conn=Depends(get_conn)):
+def model_unavailable(operation: str, e: ModelUnavailable) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Model unavailable during {operation}: {str(e)}",
+                         headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+async def call_model(tenant_id: int, operation: str, call: Awaitable[T]) -> T:
+    """Await an embedding or generation call, counting failures per tenant and reporting them as 502.
+
+    Calls refused by admission control are reported as 503 with a Retry-After header.
+    """
     try:
-        content = await file.read()
-        pdf_file = BytesIO(content)
-        pdf_reader = PdfReader(pdf_file)
-        text = "".join(page.extract_text() for page in pdf_reader.pages)
+        return await call
+    except ModelUnavailable as e:
+        raise model_unavailable(operation, e)
+    except Exception as e:
+        UPSTREAM_ERRORS.labels(str(tenant_id), operation).inc()
+        raise HTTPException(status_code=502, detail=f"Model error during {operation}: {str(e)}")
+
+
+async def generate(prompt: str):
+    """Generate an answer, sharing one call among identical prompts in flight."""
+    return await generation_gate.call(lambda: llm.generate(prompt),
+                                      hashlib.sha256(prompt.encode()).hexdigest())
+
+
+def fetch_size(options: RetrievalOptions):
+    """Number of candidates to search for, and whether they need reranking down to k.
+
+    Reranking is opt-in: a request setting none of `fetch_k`, `max_per_file` or `mmr_lambda`
+    gets the top k as searched. Setting any of them over-fetches k * MMR_FETCH_FACTOR
+    candidates unless `fetch_k` says otherwise.
+    """
+    if not options.model_fields_set & {"fetch_k", "max_per_file", "mmr_lambda"}:
+        return options.k, False
+    fetch_k = max(options.fetch_k or options.k * MMR_FETCH_FACTOR, options.k)
+    return fetch_k, fetch_k > options.k or options.max_per_file is not None
+
+
+async def search(tenant_id: int, query: Query, conn, timings: Timings):
+    fetch_k, rerank_results = fetch_size(query)
+
+    query_embedding = None
+    if query.mode != "lexical":
+        with timings.stage("embed"):
+            query_embedding = await embed_query(query.text, conn, partial(call_model, tenant_id, "embed"))
+
+    with timings.stage("search"):
+        if query.mode == "lexical":
+            results = await run_db(queries.search_chunks_lexical, conn, tenant_id, query.text, fetch_k,
+                                   with_embeddings=rerank_results)
+        elif query.mode == "hybrid":
+            results = await run_db(queries.search_chunks_hybrid, conn, tenant_id, query.text, query_embedding,
+                                   fetch_k, max(fetch_k, HYBRID_CANDIDATES), RRF_K, query.ef_search,
+                                   with_embeddings=rerank_results)
+        else:
+            results = await run_db(queries.search_chunks, conn, tenant_id, query_embedding, fetch_k, query.ef_search,
+                                   with_embeddings=rerank_results)
 
-        chunks = text_splitter.split_text(text)
+    if rerank_results:
+        with timings.stage("rerank"):
+            results = rerank(results, query.k, query.mmr_lambda, query.max_per_file)
 
-        if chunks:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(
-                    "INSERT INTO knowledge_base (tenant_id, filename) VALUES (%s, %s) RETURNING id",
-                    (tenant_id, file.filename)
-                )
-                knowledge_base_id = cur.fetchone()['id']
+    return query_embedding, results
 
-                insert_data = [
-                    (knowledge_base_id, chunk, genai.embed_content(model=EMBEDDING_MODEL, content=chunk)['embedding'])
-                    for chunk in chunks
-                ]
 
-                cur.executemany(
-                    "INSERT INTO file_chunks (knowledge_base_id, chunk_content, embedding) VALUES (%s, %s, %s)",
-                    insert_data
-                )
+async def retrieve(tenant_id: int, query: Query, conn, timings: Timings):
+    query_embedding, results = await search(tenant_id, query, conn, timings)
+    if not results:
+        raise HTTPException(status_code=404, detail="No relevant results found")
+    return query_embedding, results
 
-                conn.commit()
 
-            return {"message": f"File uploaded and processed successfully. {len(chunks)} chunks created and stored."}
+async def retrieve_batch(tenant_id: int, batch: BatchQuery, conn, timings: Timings):
+    """Embed all questions in one batched call and search for all of them in one statement."""
+    fetch_k, rerank_results = fetch_size(batch)
 
+    query_embeddings = [None] * len(batch.texts)
+    if batch.mode != "lexical":
+        with timings.stage("embed"):
+            query_embeddings = await embed_queries(batch.texts, conn, partial(call_model, tenant_id, "embed"))
+
+    with timings.stage("search"):
+        results = await run_db(queries.search_chunks_batch, conn, tenant_id, batch.mode, batch.texts,
+                               query_embeddings, fetch_k, max(fetch_k, HYBRID_CANDIDATES), RRF_K, batch.ef_search,
+                               with_embeddings=rerank_results)
+
+    if rerank_results:
+        with timings.stage("rerank"):
+            results = [rerank(hits, batch.k, batch.mmr_lambda, batch.max_per_file) for hits in results]
+
+    return query_embeddings, results
+
+
+def build_prompt(question: str, results, context_tokens: int) -> Tuple[str, List[int]]:
+    """Format PROMPT with the results packed into `context_tokens`, returning it and the ids of the chunks used."""
+    context, chunk_ids = build_context(results, context_tokens)
+    return PROMPT.format(question=question, context=context), chunk_ids
+
+
+def prompt_token_count(response, prompt: str) -> int:
+    """Prompt tokens reported by the model, or an estimate."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt)
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/search/{tenant_id}")
+async def search_knowledge_base(tenant_id: int, query: Query, response: Response, conn=Depends(get_conn)):
+    """Return the ranked chunks a query would be answered from, with their files, without generating an answer."""
+    timings = Timings("search")
+    try:
+        _, results = await search(tenant_id, query, conn, timings)
+        return {"result": results}
+
+    except HTTPException:
+        raise
     except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error searching knowledge base: {str(e)}")
+    finally:
+        timings.observe()
+        response.headers["Server-Timing"] = timings.server_timing()
 
 
 @app.post("/query/{tenant_id}")
-async def query_knowledge_base(tenant_id: int, query: Query, conn=Depends(get_conn)):
+async def query_knowledge_base(tenant_id: int, query: Query, response: Response, conn=Depends(get_conn)):
+    timings = Timings("query")
     try:
-        query_embedding = genai.embed_content(
-            model=EMBEDDING_MODEL,
-            content=query.text
-        )['embedding']
-
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT fc.chunk_content, kb.filename, 1 - (fc.embedding <=> %s::vector) AS similarity
-                FROM file_chunks fc
-                JOIN knowledge_base kb ON fc.knowledge_base_id = kb.id
-                WHERE kb.tenant_id = %s
-                ORDER BY fc.embedding <=> %s::vector
-                LIMIT %s
-            """, (query_embedding, tenant_id, query_embedding, query.k))
-
-            results = cur.fetchall()
+        query_embedding, results = await retrieve(tenant_id, query, conn, timings)
 
-        if not results:
-            raise HTTPException(status_code=404, detail="No relevant results found")
+        with timings.stage("prompt"):
+            prompt, chunk_ids = build_prompt(query.text, results, query.context_tokens)
+        llm_response = answer_cache.get(tenant_id, query.text, query.k, chunk_ids, query.context_tokens,
+                                        query_embedding)
+        cached = llm_response is not None
+        prompt_tokens = estimate_tokens(prompt)
 
-        relevant_chunks = "\n\n".join([result["chunk_content"] for result in results])
+        if not cached:
+            with timings.stage("generate"):
+                generated = await call_model(tenant_id, "generate", generate(prompt))
+                llm_response = generated.text
+            prompt_tokens = prompt_token_count(generated, prompt)
+            PROMPT_TOKENS.labels(str(tenant_id)).inc(prompt_tokens)
 
-        llm_response = llm.generate_content(
-            PROMPT.format(question=query.text, context=relevant_chunks)).text
+            answer_cache.set(tenant_id, query.text, query.k, chunk_ids, query.context_tokens, llm_response,
+                             query_embedding)
 
-        return {"result": results, "response": llm_response}
+        return {"result": results, "response": llm_response, "cached": cached, "prompt_tokens": prompt_tokens}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying knowledge base: {str(e)}")
+    finally:
+        timings.observe()
+        response.headers["Server-Timing"] = timings.server_timing()
 
 
-@app.get("/files/{tenant_id}")
-async def list_files(tenant_id: int, conn=Depends(get_conn)):
+@app.post("/query/{tenant_id}/stream")
+async def stream_query_knowledge_base(tenant_id: int, query: Query, conn=Depends(get_conn)):
+    """Answer a query as server-sent events: `sources` first, then `token` events, then `done` or `error`.
+
+    The Server-Timing header covers retrieval and prompt building only, since it is sent before generation
+    starts.
+    """
+    start = time.perf_counter()
+    timings = Timings("query_stream")
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT id, filename 
-                FROM knowledge_base 
-                WHERE tenant_id = %s
-            """, (tenant_id,))
-            files = cur.fetchall()
+        query_embedding, results = await retrieve(tenant_id, query, conn, timings)
+        with timings.stage("prompt"):
+            prompt, chunk_ids = build_prompt(query.text, results, query.context_tokens)
+        cached_response = answer_cache.get(tenant_id, query.text, query.k, chunk_ids, query.context_tokens,
+                                           query_embedding)
+        if cached_response is None:
+            # fail with a status code rather than an error event if the model is known to be down
+            try:
+                generation_gate.check()
+            except ModelUnavailable as e:
+                raise model_unavailable("generate", e)
+    except HTTPException:
+        timings.observe()
+        raise
+    except Exception as e:
+        timings.observe()
+        raise HTTPException(status_code=500, detail=f"Error querying knowledge base: {str(e)}")
+    retrieval_timing = timings.server_timing()
+
+    async def events():
+        try:
+            yield sse("sources", {"result": results})
+
+            if cached_response is not None:
+                TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                yield sse("token", {"text": cached_response})
+                yield sse("done", {"cached": True, "prompt_tokens": estimate_tokens(prompt)})
+                return
+
+            tokens = []
+            chunk = None
+            try:
+                with timings.stage("generate"):
+                    async with generation_gate.admit():
+                        async for chunk in llm.stream(prompt):
+                            if not tokens:
+                                TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                            tokens.append(chunk.text)
+                            yield sse("token", {"text": chunk.text})
+            except ModelUnavailable as e:
+                yield sse("error", {"detail": f"Model unavailable: {str(e)}"})
+                return
+            except Exception as e:
+                UPSTREAM_ERRORS.labels(str(tenant_id), "generate").inc()
+                yield sse("error", {"detail": f"Error generating response: {str(e)}"})
+                return
+            prompt_tokens = prompt_token_count(chunk, prompt)
+            PROMPT_TOKENS.labels(str(tenant_id)).inc(prompt_tokens)
+
+            answer_cache.set(tenant_id, query.text, query.k, chunk_ids, query.context_tokens, "".join(tokens),
+                             query_embedding)
+            yield sse("done", {"cached": False, "prompt_tokens": prompt_tokens})
+        finally:
+            timings.observe()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+                                      "Server-Timing": retrieval_timing})
+
+
+@app.post("/query/{tenant_id}/batch")
+async def batch_query_knowledge_base(tenant_id: int, batch: BatchQuery, response: Response, conn=Depends(get_conn)):
+    """Answer many questions with one embedding call and one search statement.
+
+    Results are returned in the order of `texts`. A question that finds no
+    chunks, or whose answer fails to generate, gets an `error` with a status
+    code instead of failing the batch. At most QUERY_BATCH_CONCURRENCY answers
+    are generated at once.
+    """
+    timings = Timings("query_batch")
+    semaphore = asyncio.Semaphore(QUERY_BATCH_CONCURRENCY)
+
+    async def answer(text, query_embedding, results):
+        if not results:
+            return {"result": [], "error": {"status_code": 404, "detail": "No relevant results found"}}
+
+        prompt, chunk_ids = build_prompt(text, results, batch.context_tokens)
+        llm_response = answer_cache.get(tenant_id, text, batch.k, chunk_ids, batch.context_tokens, query_embedding)
+        if llm_response is not None:
+            return {"result": results, "response": llm_response, "cached": True,
+                    "prompt_tokens": estimate_tokens(prompt)}
+
+        try:
+            async with semaphore:
+                generated = await call_model(tenant_id, "generate", generate(prompt))
+            llm_response = generated.text
+        except HTTPException as e:
+            return {"result": results, "error": {"status_code": e.status_code, "detail": e.detail}}
+        except Exception as e:
+            return {"result": results, "error": {"status_code": 500, "detail": f"Error generating response: {str(e)}"}}
+        prompt_tokens = prompt_token_count(generated, prompt)
+        PROMPT_TOKENS.labels(str(tenant_id)).inc(prompt_tokens)
+
+        answer_cache.set(tenant_id, text, batch.k, chunk_ids, batch.context_tokens, llm_response, query_embedding)
+        return {"result": results, "response": llm_response, "cached": False, "prompt_tokens": prompt_tokens}
 
-        files_response = [{"id": file['id'], "filename": file['filename']} for file in files]
+    try:
+        query_embeddings, results = await retrieve_batch(tenant_id, batch, conn, timings)
+        with timings.stage("generate"):
+            answers = await asyncio.gather(*[
+                answer(text, query_embedding, hits)
+                for text, query_embedding, hits in zip(batch.texts, query_embeddings, results)
+            ])
+        return {"results": answers}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error querying knowledge base: {str(e)}")
+    finally:
+        timings.observe()
+        response.headers["Server-Timing"] = timings.server_timing()
+
+
+@app.get("/files/{tenant_id}")
+async def list_files(tenant_id: int, after: Optional[int] = None,
+                     limit: int = QueryParam(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+                     fields: Optional[str] = None, conn=Depends(get_conn)):
+    """List a tenant's files by id, `limit` at a time; pass `next_cursor` back as `after` for the next page."""
+    columns = select_fields(fields, queries.FILE_FIELDS)
+    try:
+        files, next_cursor = page(await run_db(queries.list_files, conn, tenant_id, columns, after, limit + 1), limit)
 
-        return {"files": files_response}
+        return {"files": files, "next_cursor": next_cursor}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
-@app.delete("/files/{tenant_id}/{file_id}")
+@app.delete("/files/{tenant_id}/{file_id}", status_code=202)
 async def delete_file(tenant_id: int, file_id: int, conn=Depends(get_conn)):
+    """Hide the file at once; its chunks are purged by the returned job."""
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                DELETE FROM knowledge_base 
-                WHERE tenant_id = %s AND id = %s RETURNING id
-            """, (tenant_id, file_id))
-            deleted = cur.fetchone()
-            conn.commit()
+        deleted = await run_db(queries.delete_file, conn, tenant_id, file_id)
         if deleted:
-            return {"message": f"File with ID {deleted['id']} deleted successfully"}
+            answer_cache.invalidate_tenant(tenant_id)
+            return {"message": f"File with ID {deleted['id']} deleted successfully", "job_id": deleted['job_id']}
         raise HTTPException(status_code=404, detail="File not found")
+    except HTTPException:
+        raise
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/stats/pool")
+async def pool_stats():
+    return get_pool().stats()
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    return {"query_embeddings": query_cache_stats(), "answers": answer_cache.stats()}
+
+
+@app.get("/stats/models")
+async def model_stats():
+    return {"embedding": embedding_gate.stats(), "generation": generation_gate.stats()}
+
+
 if __name__ == "__main__":
     import uvicorn
 
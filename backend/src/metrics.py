@@ -0,0 +1,79 @@
+import time
+from contextlib import contextmanager
+from typing import AsyncIterable, AsyncIterator, Dict, List, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+
+T = TypeVar("T")
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Time spent in each stage of an operation, excluding nested stages.",
+    ["operation", "stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+CHUNKS_INGESTED = Counter("rag_chunks_ingested_total", "Chunks stored by ingestion.", ["tenant_id"])
+CHUNKS_PURGED = Counter("rag_chunks_purged_total", "Chunks of deleted tenants and files removed by purge jobs.")
+PROMPT_TOKENS = Counter("rag_prompt_tokens_total", "Tokens in prompts sent to the LLM.", ["tenant_id"])
+UPSTREAM_ERRORS = Counter("rag_upstream_errors_total", "Failed calls to the embedding or generation model.",
+                          ["tenant_id", "operation"])
+MODEL_QUEUE_DEPTH = Gauge("rag_model_queue_depth", "Model calls waiting for their turn under the rate limit.",
+                          ["model"])
+MODEL_QUEUE_WAIT_SECONDS = Histogram(
+    "rag_model_queue_wait_seconds", "Time model calls waited for their turn under the rate limit.", ["model"],
+    buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+MODEL_CALLS_COALESCED = Counter("rag_model_calls_coalesced_total",
+                                "Model calls answered by an identical call already in flight.", ["model"])
+MODEL_CALLS_REJECTED = Counter("rag_model_calls_rejected_total",
+                               "Model calls refused by the rate limiter or an open circuit.", ["model", "reason"])
+MODEL_CIRCUIT_OPEN = Gauge("rag_model_circuit_open", "Whether the model's circuit breaker is open.", ["model"])
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds", "Time from receiving a streamed query to sending its first answer token.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30),
+)
+
+
+class Timings:
+    """Per-stage durations of one request or job.
+
+    Stages may nest, in which case the outer stage only counts its own time.
+    `observe` records the totals in STAGE_SECONDS and `server_timing` renders
+    them as a Server-Timing header.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.stages: Dict[str, float] = {}
+        self._nested: List[float] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        self._nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+
+    def observe(self):
+        for name, seconds in self.stages.items():
+            STAGE_SECONDS.labels(self.operation, name).observe(seconds)
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+
+async def timed(items: AsyncIterable[T], timings: Timings, stage: str) -> AsyncIterator[T]:
+    """Yield from `items`, timing each wait for the next one as `stage`."""
+    iterator = aiter(items)
+    while True:
+        with timings.stage(stage):
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield item
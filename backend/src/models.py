@@ -1,10 +1,31 @@
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from consts import CONTEXT_TOKEN_BUDGET, MMR_LAMBDA, QUERY_BATCH_MAX_SIZE, RETRIEVAL_MODE
 
 
 class Tenant(BaseModel):
     name: str
 
 
-class Query(BaseModel):
-    text: str
+class RetrievalOptions(BaseModel):
     k: int = 5
+    ef_search: Optional[int] = Field(None, ge=1, le=1000)
+    mode: Literal["vector", "lexical", "hybrid"] = RETRIEVAL_MODE
+    # candidates reranked with MMR down to k; results are only reranked when fetch_k, mmr_lambda or
+    # max_per_file is set, and k * MMR_FETCH_FACTOR are fetched when fetch_k is not
+    fetch_k: Optional[int] = Field(None, ge=1, le=200)
+    mmr_lambda: float = Field(MMR_LAMBDA, ge=0, le=1)
+    max_per_file: Optional[int] = Field(None, ge=1)
+
+
+class Query(RetrievalOptions):
+    text: str
+    # estimated tokens of retrieved text packed into the prompt
+    context_tokens: int = Field(CONTEXT_TOKEN_BUDGET, ge=1)
+
+
+class BatchQuery(RetrievalOptions):
+    texts: List[str] = Field(..., min_length=1, max_length=QUERY_BATCH_MAX_SIZE)
+    context_tokens: int = Field(CONTEXT_TOKEN_BUDGET, ge=1)
@@ -0,0 +1,135 @@
+"""Embedding and generation providers, selected with EMBEDDING_PROVIDER and LLM_PROVIDER.
+
+An embedding provider embeds a batch of texts per call and declares the size
+of its vectors. Its `name` is part of every cached and stored embedding's key,
+so vectors of different providers or models are never mixed. A generation
+provider answers a prompt whole or as a stream of chunks.
+"""
+import asyncio
+import hashlib
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+
+import google.generativeai as genai
+import numpy as np
+
+from consts import EMBEDDING_DIMENSION, EMBEDDING_MODEL, EMBEDDING_PROVIDER, LLM
+
+# native dimensions of the Gemini embedding models, the size used when EMBEDDING_DIMENSION is unset
+GEMINI_EMBEDDING_DIMENSIONS = {"models/text-embedding-004": 768, "models/embedding-001": 768}
+HASHING_EMBEDDING_DIMENSION = 768
+
+
+class EmbeddingProvider(ABC):
+    name: str
+    dimension: int
+    # calls leave the process, so they are rate limited and can fail transiently
+    remote = True
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+
+class GenerationProvider(ABC):
+    name: str
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> Any:
+        """The answer, with a `text` attribute and the model's `usage_metadata` if it reports one."""
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[Any]:
+        """The answer as chunks with a `text` attribute, the last of which may carry `usage_metadata`."""
+
+
+def configure_gemini():
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+class GeminiEmbeddings(EmbeddingProvider):
+    def __init__(self, model: str = EMBEDDING_MODEL, dimension: Optional[int] = EMBEDDING_DIMENSION):
+        configure_gemini()
+        native = GEMINI_EMBEDDING_DIMENSIONS.get(model)
+        if dimension is None and native is None:
+            raise ValueError(f"Set EMBEDDING_DIMENSION to the size of {model} embeddings")
+        self.model = model
+        self.dimension = dimension or native
+        # the model's native size keeps the plain model name, so existing cache keys stay valid
+        self.output_dimensionality = None if self.dimension == native else self.dimension
+        self.name = model if self.output_dimensionality is None else f"{model}@{self.dimension}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        result = await genai.embed_content_async(model=self.model, content=texts,
+                                                 output_dimensionality=self.output_dimensionality)
+        return result['embedding']
+
+
+def hashing_embedding(text: str, dimension: int = HASHING_EMBEDDING_DIMENSION) -> List[float]:
+    """Bag-of-words embedding: each token adds to a hashed bucket, so texts sharing words are similar."""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        vector[int.from_bytes(hashlib.sha256(token.encode()).digest()[:4], "big") % dimension] += 1
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """Local bag-of-words embedder for offline ingest and benchmarks; it matches words, not meaning."""
+
+    remote = False
+
+    def __init__(self, dimension: Optional[int] = EMBEDDING_DIMENSION):
+        self.dimension = dimension or HASHING_EMBEDDING_DIMENSION
+        self.name = f"hashing-{self.dimension}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        # a batch of chunks hashes tens of thousands of tokens, too long to hold the event loop
+        return await asyncio.to_thread(lambda: [hashing_embedding(text, self.dimension) for text in texts])
+
+
+class GeminiGeneration(GenerationProvider):
+    def __init__(self, model: str = LLM):
+        configure_gemini()
+        self.name = model
+        self.model = genai.GenerativeModel(
+            model_name=model,
+            safety_settings={
+                'HATE': 'BLOCK_NONE',
+                'HARASSMENT': 'BLOCK_NONE',
+                'SEXUAL': 'BLOCK_NONE',
+                'DANGEROUS': 'BLOCK_NONE'
+            }
+        )
+
+    async def generate(self, prompt: str) -> Any:
+        return await self.model.generate_content_async(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[Any]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk
+
+
+EMBEDDING_PROVIDERS: Dict[str, Type[EmbeddingProvider]] = {"gemini": GeminiEmbeddings, "hashing": HashingEmbeddings}
+GENERATION_PROVIDERS: Dict[str, Type[GenerationProvider]] = {"gemini": GeminiGeneration}
+
+
+def _create(kind: str, providers: Dict[str, type], name: str):
+    if name not in providers:
+        raise ValueError(f"Unknown {kind} provider {name!r}, expected one of {', '.join(sorted(providers))}")
+    return providers[name]()
+
+
+def create_embedding_provider(name: str) -> EmbeddingProvider:
+    return _create("embedding", EMBEDDING_PROVIDERS, name)
+
+
+def create_generation_provider(name: str) -> GenerationProvider:
+    return _create("generation", GENERATION_PROVIDERS, name)
+
+
+# the schema and every embedding in it follow this provider, so it is chosen once per process
+embedder = create_embedding_provider(EMBEDDING_PROVIDER)
@@ -0,0 +1,34 @@
+import asyncio
+
+from consts import PURGE_BATCH_DELAY, PURGE_BATCH_SIZE
+from database import run_db, queries
+from ingest import ProgressFn
+from metrics import CHUNKS_PURGED, Timings
+
+
+async def purge_deleted(conn, payload: dict, report: ProgressFn, timings: Timings) -> dict:
+    """Remove the soft-deleted tenant or file named by `payload`, committing as it goes.
+
+    Chunks are deleted PURGE_BATCH_SIZE at a time, each batch in its own short
+    transaction followed by a PURGE_BATCH_DELAY pause, so locks and WAL stay
+    bounded and other queries are not starved. Already deleted rows are gone,
+    so a retried job resumes where it stopped.
+    """
+    with timings.stage("count"):
+        chunks_total = await run_db(queries.count_chunks, conn, **payload)
+    await report(chunks_total=chunks_total, chunks_deleted=0)
+
+    chunks_deleted = 0
+    while True:
+        with timings.stage("delete"):
+            deleted = await run_db(queries.purge_chunks, conn, PURGE_BATCH_SIZE, **payload)
+        if not deleted:
+            break
+        chunks_deleted += deleted
+        CHUNKS_PURGED.inc(deleted)
+        await report(chunks_deleted=chunks_deleted)
+        await asyncio.sleep(PURGE_BATCH_DELAY)
+
+    with timings.stage("delete"):
+        await run_db(queries.purge_deleted, conn, **payload)
+    return {"chunks_deleted": chunks_deleted}
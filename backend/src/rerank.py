@@ -0,0 +1,70 @@
+from collections import Counter
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def parse_vectors(values: Sequence[bytes]) -> np.ndarray:
+    """Decode pgvector binary values (int16 dimension, int16 unused, big-endian float32s) into a matrix.
+
+    Each value's 4-byte header is the width of one float, so the joined values
+    decode in one pass as rows of a header column followed by the vector.
+    """
+    rows = np.frombuffer(b"".join(values), dtype=">f4").reshape(len(values), -1)
+    return rows[:, 1:].astype(np.float32)
+
+
+def mmr(relevance: Sequence[float], embeddings: np.ndarray, k: int, lambda_mult: float,
+        groups: Optional[Sequence] = None, max_per_group: Optional[int] = None) -> List[int]:
+    """Select up to `k` candidate indices by maximal marginal relevance.
+
+    Each step picks the candidate maximizing
+    ``lambda_mult * relevance - (1 - lambda_mult) * max cosine to those selected``,
+    so 1 keeps the relevance order and 0 maximizes diversity. With
+    `max_per_group`, at most that many candidates are taken from each group.
+    Only the similarities to the `k` selected candidates are computed, rather
+    than the full candidate-by-candidate matrix.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    taken = Counter()
+    if max_per_group is not None:
+        groups = np.asarray(groups)
+
+    selected = []
+    while len(selected) < k and available.any():
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, vectors @ vectors[best], out=redundancy)
+        if max_per_group is not None:
+            taken[groups[best]] += 1
+            if taken[groups[best]] >= max_per_group:
+                available &= groups != groups[best]
+    return selected
+
+
+def rerank(results: List[dict], k: int, lambda_mult: float, max_per_file: Optional[int] = None) -> List[dict]:
+    """Pick `k` of the over-fetched search `results` with MMR and drop their embeddings.
+
+    Vector results are scored by cosine similarity to the query; lexical and
+    hybrid scores are rescaled so the best candidate scores 1.
+    """
+    if results:
+        if 'similarity' in results[0]:
+            relevance = [result['similarity'] for result in results]
+        else:
+            top = max(result['score'] for result in results) or 1
+            relevance = [result['score'] / top for result in results]
+        order = mmr(relevance, parse_vectors([result['embedding'] for result in results]), k, lambda_mult,
+                    [result['file_id'] for result in results], max_per_file)
+        results = [results[i] for i in order]
+    for result in results:
+        del result['embedding']
+    return results
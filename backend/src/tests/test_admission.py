@@ -0,0 +1,183 @@
+import asyncio
+import time
+
+import pytest
+
+import embeddings
+from admission import ModelGate, ModelUnavailable, TokenBucket
+from benchmarks.fakes import FakeEmbedder, FakeLLM
+from embeddings import RETRYABLE_ERRORS, embed_queries
+
+RESET_AFTER = 0.2
+
+
+def gate(rate: float = 0, burst: int = 1, max_wait: float = 10, failure_threshold: int = 3) -> ModelGate:
+    return ModelGate("fake-llm", rate, burst, trip_on=RETRYABLE_ERRORS, max_wait=max_wait,
+                     failure_threshold=failure_threshold, reset_after=RESET_AFTER)
+
+
+def test_token_bucket_allows_a_burst_then_spaces_calls():
+    bucket = TokenBucket(rate=10, burst=2)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.01)
+    assert waits[3] == pytest.approx(0.2, abs=0.01)
+
+
+def test_token_bucket_refund_returns_the_turn():
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.reserve()
+    bucket.reserve()
+    bucket.refund()
+
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+
+
+def test_gate_throttles_calls_to_the_rate():
+    llm = FakeLLM(latency=0)
+    model = gate(rate=20)
+
+    async def calls():
+        start = time.perf_counter()
+        await asyncio.gather(*[model.call(lambda: llm.generate("question")) for _ in range(5)])
+        return time.perf_counter() - start
+
+    # the first call goes at once and the other four wait 1/20 s each for their turn
+    assert asyncio.run(calls()) >= 0.18
+    assert llm.calls == 5
+
+
+def test_gate_refuses_calls_that_would_wait_too_long():
+    llm = FakeLLM(latency=0)
+    model = gate(rate=1, max_wait=0.5)
+
+    async def calls():
+        await model.call(lambda: llm.generate("question"))
+        await model.call(lambda: llm.generate("question"))
+
+    with pytest.raises(ModelUnavailable) as refused:
+        asyncio.run(calls())
+    assert refused.value.reason == "rate limited"
+    assert model.rejected["rate_limited"] == 1
+    assert llm.calls == 1
+
+
+def test_concurrent_calls_with_one_key_share_an_upstream_call():
+    llm = FakeLLM(latency=0.05)
+    model = gate()
+
+    async def calls():
+        same = [model.call(lambda: llm.generate("question"), key="question") for _ in range(10)]
+        other = model.call(lambda: llm.generate("other question"), key="other question")
+        return await asyncio.gather(*same, other)
+
+    answers = asyncio.run(calls())
+
+    assert len({id(answer) for answer in answers[:10]}) == 1
+    assert llm.calls == 2
+    assert model.coalesced == 9
+    assert len(model.flights) == 0
+
+
+def test_coalesced_callers_all_get_the_error():
+    llm = FakeLLM(latency=0.05, error_rate=1.0)
+    model = gate(failure_threshold=10)
+
+    async def calls():
+        return await asyncio.gather(*[model.call(lambda: llm.generate("question"), key="question")
+                                      for _ in range(5)], return_exceptions=True)
+
+    errors = asyncio.run(calls())
+
+    assert all(isinstance(error, RETRYABLE_ERRORS) for error in errors)
+    assert llm.calls == 1
+
+
+def test_circuit_opens_half_opens_and_closes():
+    llm = FakeLLM(latency=0, error_rate=1.0)
+    model = gate(failure_threshold=3)
+
+    async def outage_and_recovery():
+        for _ in range(3):
+            with pytest.raises(RETRYABLE_ERRORS):
+                await model.call(lambda: llm.generate("question"))
+        assert model.breaker.state == "open"
+
+        # refused without reaching the model
+        with pytest.raises(ModelUnavailable) as refused:
+            await model.call(lambda: llm.generate("question"))
+        assert refused.value.reason == "unavailable"
+        assert llm.calls == 3
+        assert model.rejected["circuit_open"] == 1
+
+        await asyncio.sleep(RESET_AFTER)
+        assert model.breaker.state == "half_open"
+
+        llm.error_rate = 0.0
+        await model.call(lambda: llm.generate("question"))
+        assert model.breaker.state == "closed"
+        assert model.breaker.failures == 0
+
+    asyncio.run(outage_and_recovery())
+
+
+def test_failed_trial_reopens_the_circuit():
+    llm = FakeLLM(latency=0, error_rate=1.0)
+    model = gate(failure_threshold=1)
+
+    async def failed_trial():
+        with pytest.raises(RETRYABLE_ERRORS):
+            await model.call(lambda: llm.generate("question"))
+        await asyncio.sleep(RESET_AFTER)
+        assert model.breaker.state == "half_open"
+
+        with pytest.raises(RETRYABLE_ERRORS):
+            await model.call(lambda: llm.generate("question"))
+        assert model.breaker.state == "open"
+        with pytest.raises(ModelUnavailable):
+            await model.call(lambda: llm.generate("question"))
+
+    asyncio.run(failed_trial())
+    assert llm.calls == 2
+
+
+def test_half_open_circuit_lets_one_trial_through():
+    llm = FakeLLM(latency=0, error_rate=1.0)
+    model = gate(failure_threshold=1)
+
+    async def trial_and_other():
+        with pytest.raises(RETRYABLE_ERRORS):
+            await model.call(lambda: llm.generate("question"))
+        await asyncio.sleep(RESET_AFTER)
+        llm.latency, llm.error_rate = 0.1, 0.0
+
+        trial = asyncio.create_task(model.call(lambda: llm.generate("trial")))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ModelUnavailable):
+            await model.call(lambda: llm.generate("other"))
+        await trial
+
+    asyncio.run(trial_and_other())
+    assert llm.calls == 2
+    assert model.breaker.state == "closed"
+
+
+def test_query_embeddings_fail_fast_while_the_circuit_is_open(monkeypatch):
+    embedder = FakeEmbedder(latency=0, error_rate=1.0)
+    model = gate(failure_threshold=1)
+    monkeypatch.setattr(embeddings, "embedding_gate", model)
+    monkeypatch.setattr(embeddings.embedder, "embed", embedder.embed)
+
+    async def outage():
+        with pytest.raises(RETRYABLE_ERRORS):
+            await model.call(lambda: embedder.embed(["question"]))
+        embedder.error_rate = 0.0
+
+        # not retried after the circuit's Retry-After, which would send trial calls upstream
+        with pytest.raises(ModelUnavailable):
+            await embed_queries(["first uncached question", "second uncached question"])
+
+    asyncio.run(outage())
+    assert embedder.calls == 1
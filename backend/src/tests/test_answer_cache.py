@@ -0,0 +1,43 @@
+from answer_cache import AnswerCache
+
+
+def test_hit_on_the_same_normalized_question_and_retrieval():
+    cache = AnswerCache(10)
+    cache.set(1, "What is RAG?", 5, [3, 4], 2000, "an answer")
+
+    assert cache.get(1, "  what is   rag? ", 5, [3, 4], 2000) == "an answer"
+    assert cache.get(1, "What is RAG?", 4, [3, 4], 2000) is None
+    assert cache.get(1, "What is RAG?", 5, [3, 5], 2000) is None
+    assert cache.get(2, "What is RAG?", 5, [3, 4], 2000) is None
+    # a smaller budget packs the same chunks into another context
+    assert cache.get(1, "What is RAG?", 5, [3, 4], 500) is None
+
+
+def test_invalidating_a_tenant_drops_only_its_answers():
+    cache = AnswerCache(10)
+    cache.set(1, "question", 5, [3], 2000, "tenant one")
+    cache.set(2, "question", 5, [7], 2000, "tenant two")
+
+    cache.invalidate_tenant(1)
+
+    assert cache.get(1, "question", 5, [3], 2000) is None
+    assert cache.get(2, "question", 5, [7], 2000) == "tenant two"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_similar_question_hits_above_the_threshold():
+    cache = AnswerCache(10, semantic_threshold=0.95)
+    cache.set(1, "what is rag", 5, [3], 2000, "an answer", embedding=[1.0, 0.0])
+
+    assert cache.get(1, "explain rag", 5, [3], 2000, embedding=[0.99, 0.05]) == "an answer"
+    assert cache.get(1, "who wrote this", 5, [3], 2000, embedding=[0.5, 0.5]) is None
+    # a similar question with other retrieved chunks is a different question
+    assert cache.get(1, "explain rag", 5, [4], 2000, embedding=[0.99, 0.05]) is None
+    assert cache.semantic_hits == 1
+
+
+def test_similar_questions_do_not_hit_without_a_threshold():
+    cache = AnswerCache(10)
+    cache.set(1, "what is rag", 5, [3], 2000, "an answer", embedding=[1.0, 0.0])
+
+    assert cache.get(1, "explain rag", 5, [3], 2000, embedding=[1.0, 0.0]) is None
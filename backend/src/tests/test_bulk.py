@@ -0,0 +1,46 @@
+import struct
+
+import numpy as np
+
+from database.bulk import COPY_HEADER, COPY_TRAILER, encode_chunk_rows
+
+
+def read_rows(data: bytes):
+    """Split a binary COPY stream into rows of raw field values."""
+    assert data.startswith(COPY_HEADER) and data.endswith(COPY_TRAILER)
+    position, end, rows = len(COPY_HEADER), len(data) - len(COPY_TRAILER), []
+    while position < end:
+        (count,), position = struct.unpack_from("!h", data, position), position + 2
+        fields = []
+        for _ in range(count):
+            (length,), position = struct.unpack_from("!i", data, position), position + 4
+            fields.append(data[position:position + length])
+            position += length
+        rows.append(fields)
+    assert position == end
+    return rows
+
+
+def test_chunk_rows_in_binary_copy_format():
+    embeddings = [[0.5, -1.0, 2.0], [0.0, 0.25, -0.125]]
+
+    data = encode_chunk_rows(7, 42, ["first", "café"], ["hash1", "hash2"], [0, 1], embeddings).getvalue()
+    rows = read_rows(data)
+
+    assert len(rows) == 2
+    for (kb_id, tenant_id, content, content_hash, chunk_index, vector), expected, index in zip(
+            rows, embeddings, [0, 1]):
+        assert struct.unpack("!i", kb_id) == (42,)
+        assert struct.unpack("!i", tenant_id) == (7,)
+        assert struct.unpack("!i", chunk_index) == (index,)
+        # pgvector's binary vector: int16 dimension, int16 unused, big-endian float32 values
+        assert struct.unpack_from("!hh", vector) == (3, 0)
+        np.testing.assert_array_equal(np.frombuffer(vector, dtype=">f4", offset=4), expected)
+    assert [row[2] for row in rows] == [b"first", "café".encode()]
+    assert [row[3] for row in rows] == [b"hash1", b"hash2"]
+
+
+def test_text_is_encoded_in_the_connection_encoding():
+    data = encode_chunk_rows(1, 1, ["café"], ["hash"], [0], [[1.0]], encoding="latin-1").getvalue()
+
+    assert read_rows(data)[0][2] == "café".encode("latin-1")
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main as server
+from benchmarks.concurrency import StubConnection, StubModel
+from database import get_conn
+from providers import embedder
+
+LATENCY = 0.2
+REQUESTS = 10
+
+
+@pytest.fixture
+def stubbed_app(monkeypatch):
+    """The app with embedding and generation stubs that sleep asynchronously and a database that blocks."""
+    async def embed_query(text, conn=None, upstream=None):
+        await asyncio.sleep(LATENCY)
+        return [0.0] * embedder.dimension
+
+    async def stub_conn():
+        yield StubConnection(LATENCY)
+
+    monkeypatch.setattr(server, "embed_query", embed_query)
+    monkeypatch.setattr(server, "llm", StubModel(LATENCY))
+    monkeypatch.setitem(server.app.dependency_overrides, get_conn, stub_conn)
+    return server.app
+
+
+async def timed_queries(app, texts):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post("/query/1", json={"text": text, "k": 5}) for text in texts])
+        elapsed = time.perf_counter() - start
+    assert [response.status_code for response in responses] == [200] * len(texts)
+    return elapsed
+
+
+def test_parallel_queries_overlap(stubbed_app):
+    single = asyncio.run(timed_queries(stubbed_app, ["single question"]))
+    parallel = asyncio.run(timed_queries(stubbed_app, [f"parallel question {i}" for i in range(REQUESTS)]))
+
+    # queued on the event loop the batch would take REQUESTS times as long as one request
+    assert parallel < 2 * single, (single, parallel)
@@ -0,0 +1,62 @@
+import context
+from context import build_context, estimate_tokens
+
+
+def chunk(id, file_id, chunk_index, text):
+    return {"id": id, "file_id": file_id, "chunk_index": chunk_index, "chunk_content": text}
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 40) == 40 // context.CHARS_PER_TOKEN
+
+
+def test_consecutive_chunks_of_a_file_are_merged():
+    results = [chunk(2, 1, 1, "second chunk"), chunk(9, 2, 0, "other file"), chunk(1, 1, 0, "first chunk")]
+
+    text, ids = build_context(results, budget=1000)
+
+    # the merged passage ranks by its best chunk, the first result
+    assert text == "first chunk\nsecond chunk\n\nother file"
+    assert ids == [1, 2, 9]
+
+
+def test_gaps_and_other_files_are_not_merged():
+    results = [chunk(1, 1, 0, "page one"), chunk(3, 1, 2, "page three"), chunk(4, 2, 1, "another file")]
+
+    text, ids = build_context(results, budget=1000)
+
+    assert text == "page one\n\npage three\n\nanother file"
+    assert ids == [1, 3, 4]
+
+
+def test_overlap_between_merged_chunks_is_dropped(monkeypatch):
+    monkeypatch.setattr(context, "CHUNK_OVERLAP", 10)
+    results = [chunk(1, 1, 0, "the quick brown fox"), chunk(2, 1, 1, "brown fox jumps over")]
+
+    text, ids = build_context(results, budget=1000)
+
+    assert text == "the quick brown fox jumps over"
+    assert ids == [1, 2]
+
+
+def test_passages_that_do_not_fit_are_skipped():
+    results = [chunk(1, 1, 0, "a" * 40), chunk(2, 2, 0, "b" * 400), chunk(3, 3, 0, "c" * 40)]
+
+    text, ids = build_context(results, budget=estimate_tokens("a" * 80))
+
+    assert text == "a" * 40 + "\n\n" + "c" * 40
+    assert ids == [1, 3]
+
+
+def test_best_passage_is_truncated_when_nothing_fits():
+    results = [chunk(1, 1, 0, "a" * 400), chunk(2, 2, 0, "b" * 400)]
+
+    text, ids = build_context(results, budget=10)
+
+    assert text == "a" * 10 * context.CHARS_PER_TOKEN
+    assert ids == [1]
+
+
+def test_no_results():
+    assert build_context([], budget=100) == ("", [])
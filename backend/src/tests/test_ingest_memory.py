@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from pypdf import PdfReader
+
+import documents
+from benchmarks import ingest_memory
+from benchmarks.ingest_memory import InlineExecutor, peak_mib, stream
+from benchmarks.pdfs import _content_stream, page_texts, write_pdf
+from documents import count_pages, extract_pages
+
+SMALL_PAGES = 100
+LARGE_PAGES = 400
+# small windows, so the small file already reaches the steady state the bound is about
+WINDOW_SIZE = 50
+# allowed ratio between the peak heap of ingesting the large file and the small one
+TOLERANCE = 1.5
+
+
+@pytest.fixture(autouse=True)
+def inline_extraction(monkeypatch):
+    """Extract pages in this process, where tracemalloc sees them, rather than in the worker processes."""
+    monkeypatch.setattr(documents, "_executor", InlineExecutor())
+
+
+def streaming_peak(path) -> float:
+    chunks, peak, _ = peak_mib(lambda: asyncio.run(stream(path)))
+    assert chunks > 0
+    return peak
+
+
+def test_ingest_memory_does_not_grow_with_file_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_memory, "INGEST_WINDOW_SIZE", WINDOW_SIZE)
+    peaks = []
+    for pages in (SMALL_PAGES, LARGE_PAGES):
+        path = str(tmp_path / f"{pages}.pdf")
+        write_pdf(path, page_texts(pages))
+        peaks.append(streaming_peak(path))
+
+    assert peaks[1] <= TOLERANCE * peaks[0], peaks
+
+
+def write_nested_pdf(path, texts):
+    """A PDF whose page tree nests two levels deep, with the font resources set on the inner nodes only."""
+    objects = {3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    groups = [list(range(start, min(start + 3, len(texts)))) for start in range(0, len(texts), 3)]
+    node_numbers = [4 + 2 * len(texts) + i for i in range(len(groups))]
+    for number, group in zip(node_numbers, groups):
+        for index in group:
+            stream = _content_stream(texts[index])
+            objects[4 + 2 * index] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+            objects[5 + 2 * index] = (b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R >>"
+                                      % (number, 4 + 2 * index))
+        kids = b" ".join(b"%d 0 R" % (5 + 2 * index) for index in group)
+        objects[number] = (b"<< /Type /Pages /Parent 2 0 R /Kids [" + kids + b"] /Count %d "
+                           b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(group))
+    kids = b" ".join(b"%d 0 R" % number for number in node_numbers)
+    objects[2] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(texts)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+
+    with open(path, "wb") as out:
+        out.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number, body in sorted(objects.items()):
+            offsets[number] = out.tell()
+            out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = out.tell()
+        size = max(objects) + 1
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        out.writelines(b"%010d 00000 n \n" % offsets[number] for number in range(1, size))
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+
+
+@pytest.mark.parametrize("start, stop", [(0, 10), (0, 4), (2, 7), (6, 9), (9, 10)])
+def test_page_ranges_match_the_reader(tmp_path, start, stop):
+    path = str(tmp_path / "nested.pdf")
+    write_nested_pdf(path, list(page_texts(10, chars_per_page=200)))
+    expected = [page.extract_text() for page in PdfReader(path).pages]
+
+    assert count_pages(path) == 10
+    assert extract_pages(path, start, stop) == expected[start:stop]
+    assert all(expected)
+    # the worker's reader stays open for the next batch until the last page is read
+    assert (documents._open_pdf.current is None) == (stop == 10)
@@ -0,0 +1,49 @@
+import os
+
+import psycopg2
+import pytest
+
+from database.config import db_config
+from database.queries import _lexical_query
+
+pytestmark = pytest.mark.skipif(not os.getenv("POSTGRES_HOST"), reason="needs a Postgres database, set POSTGRES_*")
+
+
+@pytest.fixture(scope="module")
+def cur():
+    conn = psycopg2.connect(**db_config())
+    try:
+        with conn.cursor() as cur:
+            yield cur
+    finally:
+        conn.close()
+
+
+def lexical_query(cur, text):
+    cur.execute(f"SELECT query::text FROM ({_lexical_query()}) lexical", {"text": text})
+    return cur.fetchone()[0]
+
+
+def matches(cur, text, document):
+    cur.execute(f"SELECT to_tsvector('english', %(document)s) @@ query FROM ({_lexical_query()}) lexical",
+                {"text": text, "document": document})
+    return cur.fetchone()[0]
+
+
+@pytest.mark.parametrize("text", [
+    r"What does C:\Program Files\app\config.ini set?",
+    r"why is \\server\share\ slow",
+    "what's the O'Brien error, \\' or \\\\?",
+    "E'\\x41' && (a | b) & !c <-> d:*",
+])
+def test_punctuation_and_backslashes_make_a_valid_query(cur, text):
+    assert lexical_query(cur, text)
+
+
+def test_any_lexeme_matches(cur):
+    assert matches(cur, r"where is error E-1042 in C:\logs\app.log?", "E-1042 is raised when the disk is full")
+    assert not matches(cur, r"where is error E-1042?", "the disk is full")
+
+
+def test_no_lexemes_make_an_empty_query(cur):
+    assert lexical_query(cur, r"\\ ' ?! --") == ""
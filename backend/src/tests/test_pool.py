@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from psycopg2 import extensions
+
+from database.pool import ConnectionPool
+
+
+class FakeConnection:
+    closed = False
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+
+def slow_connect():
+    time.sleep(0.2)
+    return FakeConnection()
+
+
+def test_cancelled_acquire_returns_the_connection_to_the_pool():
+    pool = ConnectionPool(slow_connect, minconn=0, maxconn=1, timeout=1, health_check_interval=30)
+
+    async def cancel_then_acquire():
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        # the only slot comes back once the abandoned checkout finishes, with its connection
+        conn = await pool.acquire()
+        stats = pool.stats()
+        await pool.release(conn)
+        return stats
+
+    stats = asyncio.run(cancel_then_acquire())
+
+    assert stats["size"] == 1
+    assert stats["acquired_total"] == 1
+    assert pool.stats()["idle"] == 1
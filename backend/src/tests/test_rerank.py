@@ -0,0 +1,78 @@
+import struct
+
+import numpy as np
+import pytest
+
+from consts import MMR_FETCH_FACTOR
+from main import fetch_size
+from models import Query
+
+from rerank import mmr, parse_vectors, rerank
+
+
+def vector_send(values) -> bytes:
+    """A vector as pgvector's vector_send returns it."""
+    return struct.pack("!hh", len(values), 0) + np.asarray(values, dtype=">f4").tobytes()
+
+
+def result(id, file_id, embedding, **score):
+    return {"id": id, "file_id": file_id, "filename": "notes.pdf", "embedding": vector_send(embedding), **score}
+
+
+def test_parse_vectors_decodes_pgvector_binary():
+    vectors = parse_vectors([vector_send([1.0, -2.5, 0.0]), vector_send([0.5, 0.25, 3.0])])
+
+    assert vectors.dtype == np.float32
+    np.testing.assert_array_equal(vectors, [[1.0, -2.5, 0.0], [0.5, 0.25, 3.0]])
+
+
+def test_mmr_with_lambda_one_keeps_relevance_order():
+    embeddings = np.array([[1, 0], [1, 0.01], [0, 1]])
+
+    assert mmr([0.9, 0.8, 0.7], embeddings, 3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_mmr_skips_near_duplicates():
+    embeddings = np.array([[1, 0], [1, 0.01], [0, 1]])
+
+    assert mmr([0.9, 0.85, 0.5], embeddings, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_caps_candidates_per_group():
+    embeddings = np.eye(4)
+
+    assert mmr([0.9, 0.8, 0.7, 0.6], embeddings, 3, 1.0, groups=["a", "a", "a", "b"], max_per_group=2) == [0, 1, 3]
+
+
+def test_rerank_caps_per_file_id_not_filename():
+    results = [result(1, 10, [1, 0, 0], similarity=0.9), result(2, 10, [0, 1, 0], similarity=0.8),
+               result(3, 11, [0, 0, 1], similarity=0.7)]
+
+    reranked = rerank(results, 3, 1.0, max_per_file=1)
+
+    # both files are named notes.pdf, but they are different files
+    assert [row["id"] for row in reranked] == [1, 3]
+    assert all("embedding" not in row for row in reranked)
+
+
+def test_rerank_rescales_scores_of_lexical_and_hybrid_results():
+    results = [result(1, 10, [1, 0], score=4.0), result(2, 11, [1, 0.01], score=3.8),
+               result(3, 12, [0, 1], score=2.0)]
+
+    # rescaled to 1, 0.95 and 0.5, the near duplicate loses to the distinct result
+    assert [row["id"] for row in rerank(results, 2, 0.5)] == [1, 3]
+
+
+def test_rerank_of_no_results():
+    assert rerank([], 5, 0.7) == []
+
+
+@pytest.mark.parametrize("options, expected", [
+    ({}, (5, False)),
+    ({"mmr_lambda": 0.5}, (5 * MMR_FETCH_FACTOR, True)),
+    ({"max_per_file": 1}, (5 * MMR_FETCH_FACTOR, True)),
+    ({"fetch_k": 12}, (12, True)),
+    ({"fetch_k": 5}, (5, False)),
+])
+def test_reranking_is_on_when_a_request_sets_an_mmr_option(options, expected):
+    assert fetch_size(Query(text="question", k=5, **options)) == expected
@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main as server
+from database import get_conn, queries
+
+
+@pytest.fixture
+def deleted_tenant_app(monkeypatch):
+    """The app with a database in which every tenant has been deleted."""
+    async def stub_conn():
+        yield None
+
+    async def spool_upload(file):
+        raise AssertionError("a deleted tenant's upload was spooled")
+
+    monkeypatch.setattr(queries, "get_live_tenant", lambda conn, tenant_id: None)
+    monkeypatch.setattr(server, "spool_upload", spool_upload)
+    monkeypatch.setitem(server.app.dependency_overrides, get_conn, stub_conn)
+    return server.app
+
+
+async def post(app, url, files):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(url, files=files)
+
+
+@pytest.mark.parametrize("url, files", [
+    ("/upload/1", [("file", ("a.pdf", b"%PDF-1.4", "application/pdf"))]),
+    ("/upload/1/batch", [("files", ("a.pdf", b"%PDF-1.4", "application/pdf")),
+                         ("files", ("b.pdf", b"%PDF-1.5", "application/pdf"))]),
+])
+def test_uploads_to_a_deleted_tenant_are_refused(deleted_tenant_app, url, files):
+    response = asyncio.run(post(deleted_tenant_app, url, files))
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Tenant not found"
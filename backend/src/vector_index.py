@@ -0,0 +1,79 @@
+"""Build the file_chunks HNSW index used by a VECTOR_INDEX_MODE.
+
+Set VECTOR_INDEX_MODE on the backend once the index is built. The compact
+modes index an expression over the existing embeddings, so building the index
+is the whole backfill. They need pgvector 0.7 or newer. Indexes are built
+CONCURRENTLY, so ingestion and queries keep running. From ``backend/src``::
+
+    python vector_index.py --mode halfvec
+    python vector_index.py --mode halfvec --drop-unused   # once the backend runs in halfvec mode
+"""
+import argparse
+import sys
+
+from consts import VECTOR_INDEX_MODE
+from database.connect import get_db_connection
+from database.queries import VECTOR_INDEXES, get_embedding_dimensions
+
+COMPACT_MIN_PGVECTOR = (0, 7, 0)
+
+
+def pgvector_version(cur) -> tuple:
+    cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    return tuple(int(part) for part in cur.fetchone()[0].split("."))
+
+
+def index_state(cur, name: str):
+    """Return None when the index is missing, else whether it is valid (a failed concurrent build is not)."""
+    cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def ensure_index(cur, mode: str, dimension: int):
+    """Build the index of `mode` over embeddings of `dimension`, the size of the file_chunks column."""
+    index = VECTOR_INDEXES[mode]
+    if index_state(cur, index["name"]) is False:
+        print(f"dropping invalid index {index['name']} left by an interrupted build")
+        cur.execute(f"DROP INDEX CONCURRENTLY {index['name']}")
+    print(f"building {index['name']}")
+    definition = index["definition"].format(dimension=dimension)
+    cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index['name']} ON file_chunks USING {definition}")
+
+
+def index_sizes(cur) -> dict:
+    sizes = {}
+    for index in VECTOR_INDEXES.values():
+        cur.execute("SELECT pg_size_pretty(pg_relation_size(to_regclass(%s)))", (index["name"],))
+        sizes[index["name"]] = cur.fetchone()[0]
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=sorted(VECTOR_INDEXES), default=VECTOR_INDEX_MODE)
+    parser.add_argument("--drop-unused", action="store_true", help="drop the indexes of the other modes")
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="memory for the index build")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        dimension = get_embedding_dimensions(conn)["file_chunks"]
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            if args.mode != "full" and pgvector_version(cur) < COMPACT_MIN_PGVECTOR:
+                sys.exit(f"{args.mode} mode needs pgvector >= {'.'.join(map(str, COMPACT_MIN_PGVECTOR))}")
+            cur.execute("SELECT set_config('maintenance_work_mem', %s, false)", (args.maintenance_work_mem,))
+            ensure_index(cur, args.mode, dimension)
+            if args.drop_unused:
+                for mode, index in VECTOR_INDEXES.items():
+                    if mode != args.mode:
+                        print(f"dropping {index['name']}")
+                        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']}")
+            print(index_sizes(cur))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+from prometheus_client import start_http_server
+
+from consts import (
+    WORKER_CONCURRENCY, WORKER_METRICS_PORT, JOB_POLL_INTERVAL, JOB_HEARTBEAT_INTERVAL, JOB_STALE_AFTER,
+    JOB_MAX_ATTEMPTS
+)
+from database import open_pool, close_pool, run_db, shutdown_db_executor, queries
+from database.pool import ConnectionPool
+from documents import shutdown_pdf_executor
+from embeddings import check_embedding_dimension
+from ingest import ingest_file
+from metrics import CHUNKS_INGESTED, Timings
+from purge import purge_deleted
+
+
+async def heartbeat(pool: ConnectionPool, job_id: int):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        async with pool.connection() as conn:
+            await run_db(queries.update_job_progress, conn, job_id, {})
+
+
+async def process_job(pool: ConnectionPool, job: dict):
+    payload = job['payload']
+
+    async def report(**progress):
+        async with pool.connection() as conn:
+            await run_db(queries.update_job_progress, conn, job['id'], progress)
+
+    timings = Timings(job['kind'])
+    beat = asyncio.create_task(heartbeat(pool, job['id']))
+    try:
+        # An ingest's chunks and the job's completion are committed in one transaction,
+        # so a crash mid-ingest leaves nothing behind and the job is simply reclaimed;
+        # only the shared embedding store, which any upload may reuse, is committed as it goes.
+        # A purge commits batch by batch and a reclaimed job deletes what is left.
+        async with pool.connection() as conn:
+            try:
+                if job['kind'] == 'purge':
+                    result = await purge_deleted(conn, payload, report, timings)
+                else:
+                    result = await ingest_file(pool, conn, job['tenant_id'], payload['filename'], payload['path'],
+                                               payload['file_hash'], report, timings)
+                await run_db(queries.complete_job, conn, job['id'], result)
+            except BaseException:
+                await run_db(conn.rollback)
+                raise
+        if job['kind'] == 'ingest':
+            CHUNKS_INGESTED.labels(str(job['tenant_id'])).inc(result.get('chunks', 0))
+        finished = True
+    except Exception as e:
+        retry = job['attempts'] < JOB_MAX_ATTEMPTS
+        async with pool.connection() as conn:
+            await run_db(queries.fail_job, conn, job['id'], str(e), retry)
+        finished = not retry
+    finally:
+        beat.cancel()
+        timings.observe()
+
+    if finished:
+        remove_upload(payload)
+
+
+def remove_upload(payload: dict):
+    if 'path' in payload and os.path.exists(payload['path']):
+        os.remove(payload['path'])
+
+
+async def run_worker(pool: ConnectionPool):
+    while True:
+        async with pool.connection() as conn:
+            # jobs that ran out of attempts are not reclaimed, so fail them rather than leave them running
+            for payload in await run_db(queries.fail_stale_jobs, conn, JOB_STALE_AFTER, JOB_MAX_ATTEMPTS):
+                remove_upload(payload)
+            job = await run_db(queries.claim_job, conn, JOB_STALE_AFTER, JOB_MAX_ATTEMPTS)
+        if job is None:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            continue
+        await process_job(pool, job)
+
+
+async def main():
+    if WORKER_METRICS_PORT:
+        start_http_server(WORKER_METRICS_PORT)
+    pool = await open_pool()
+    try:
+        async with pool.connection() as conn:
+            await check_embedding_dimension(conn)
+        await asyncio.gather(*(run_worker(pool) for _ in range(WORKER_CONCURRENCY)))
+    finally:
+        await close_pool()
+        shutdown_pdf_executor()
+        shutdown_db_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
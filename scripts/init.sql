@@ -4,23 +4,106 @@ CREATE EXTENSION IF NOT EXISTS vector;
 -- Create the tenants table
 CREATE TABLE IF NOT EXISTS tenants (
   id SERIAL PRIMARY KEY,
-  name TEXT UNIQUE NOT NULL,
-  created_at TIMESTAMPTZ DEFAULT now()
+  name TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  -- set when the tenant is deleted, a purge job then removes it in batches
+  deleted_at TIMESTAMPTZ
 );
 
+-- The name of a deleted tenant can be reused while it is being purged
+CREATE UNIQUE INDEX IF NOT EXISTS tenants_name_idx ON tenants (name) WHERE deleted_at IS NULL;
+
 -- Create the knowledge_base table to store file metadata
 CREATE TABLE IF NOT EXISTS knowledge_base (
   id SERIAL PRIMARY KEY,
   tenant_id INTEGER REFERENCES tenants(id) ON DELETE CASCADE,
   filename TEXT NOT NULL,
-  created_at TIMESTAMPTZ DEFAULT now()
+  file_hash TEXT,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  -- set when the file or its tenant is deleted, searches skip its chunks until a purge job removes them
+  deleted_at TIMESTAMPTZ
 );
 
+-- A tenant stores each distinct file once, and can upload a deleted file again while it is being purged
+CREATE UNIQUE INDEX IF NOT EXISTS knowledge_base_tenant_file_hash_live_idx ON knowledge_base (tenant_id, file_hash)
+  WHERE deleted_at IS NULL;
+-- The few files awaiting a purge, looked up by every search to exclude their chunks
+CREATE INDEX IF NOT EXISTS knowledge_base_deleted_idx ON knowledge_base (tenant_id) WHERE deleted_at IS NOT NULL;
+-- Lists a tenant's files in id order for keyset pagination
+CREATE INDEX IF NOT EXISTS knowledge_base_tenant_id_id_idx ON knowledge_base (tenant_id, id);
+
 -- Create the file_chunks table to store chunks and embeddings
 CREATE TABLE IF NOT EXISTS file_chunks (
   id SERIAL PRIMARY KEY,
   knowledge_base_id INTEGER REFERENCES knowledge_base(id) ON DELETE CASCADE,
+  tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
   chunk_content TEXT NOT NULL,
+  content_hash TEXT,
+  -- position of the chunk in its file, used to merge adjacent chunks into one passage of context
+  chunk_index INTEGER,
+  -- sized for the default embedding provider, backend/src/embedding_schema.py resizes the embedding columns
   embedding vector(768),
+  content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', chunk_content)) STORED,
   created_at TIMESTAMPTZ DEFAULT now()
-);
\ No newline at end of file
+);
+
+CREATE INDEX IF NOT EXISTS file_chunks_knowledge_base_id_idx ON file_chunks (knowledge_base_id);
+
+-- Vector search is always scoped to one tenant
+CREATE INDEX IF NOT EXISTS file_chunks_tenant_id_idx ON file_chunks (tenant_id);
+-- The compact halfvec and binary indexes used by VECTOR_INDEX_MODE are built by backend/src/vector_index.py
+CREATE INDEX IF NOT EXISTS file_chunks_embedding_idx ON file_chunks USING hnsw (embedding vector_cosine_ops);
+
+-- Full-text index for lexical and hybrid retrieval of exact terms such as part numbers and error codes
+CREATE INDEX IF NOT EXISTS file_chunks_content_tsv_idx ON file_chunks USING gin (content_tsv);
+
+-- pgvector >= 0.8 (the pgvector/pgvector:pg16 image in docker-compose.yml) keeps scanning
+-- the HNSW graph until enough rows pass the tenant filter. Older versions return fewer
+-- than k rows for tenants with a small share of the table.
+DO $$
+BEGIN
+  IF string_to_array((SELECT extversion FROM pg_extension WHERE extname = 'vector'), '.')::int[] >= '{0,8,0}' THEN
+    EXECUTE format('ALTER DATABASE %I SET hnsw.iterative_scan = strict_order', current_database());
+  ELSE
+    RAISE WARNING 'pgvector % has no hnsw.iterative_scan, so small tenants can get fewer than k results; upgrade to 0.8 or later',
+      (SELECT extversion FROM pg_extension WHERE extname = 'vector');
+  END IF;
+END
+$$;
+
+-- Cache of query embeddings shared across workers and restarts, keyed by model and normalized query
+CREATE TABLE IF NOT EXISTS query_embedding_cache (
+  model TEXT NOT NULL,
+  query_hash TEXT NOT NULL,
+  embedding vector(768) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (model, query_hash)
+);
+
+-- Content-addressed embeddings, keyed by sha256 of model and chunk text, so
+-- identical chunks are embedded once across files and tenants
+CREATE TABLE IF NOT EXISTS chunk_embeddings (
+  content_hash TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  embedding vector(768) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Durable queue of background jobs, claimed by workers with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS jobs (
+  id SERIAL PRIMARY KEY,
+  kind TEXT NOT NULL,
+  tenant_id INTEGER REFERENCES tenants(id) ON DELETE CASCADE,
+  status TEXT NOT NULL DEFAULT 'queued',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  payload JSONB NOT NULL DEFAULT '{}',
+  progress JSONB NOT NULL DEFAULT '{}',
+  result JSONB,
+  error TEXT,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  started_at TIMESTAMPTZ,
+  heartbeat_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS jobs_claimable_idx ON jobs (id) WHERE status IN ('queued', 'running');
\ No newline at end of file
@@ -0,0 +1,41 @@
+-- Store tenant_id on file_chunks and add the vector search indexes.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/001_file_chunks_tenant_id.sql
+
+BEGIN;
+
+ALTER TABLE file_chunks ADD COLUMN IF NOT EXISTS tenant_id INTEGER REFERENCES tenants(id) ON DELETE CASCADE;
+
+UPDATE file_chunks fc
+SET tenant_id = kb.tenant_id
+FROM knowledge_base kb
+WHERE fc.knowledge_base_id = kb.id AND fc.tenant_id IS NULL;
+
+-- Chunks whose file has no tenant were never reachable from /query
+DELETE FROM file_chunks WHERE tenant_id IS NULL;
+
+ALTER TABLE file_chunks ALTER COLUMN tenant_id SET NOT NULL;
+
+COMMIT;
+
+-- Build the indexes without blocking uploads
+CREATE INDEX CONCURRENTLY IF NOT EXISTS file_chunks_knowledge_base_id_idx ON file_chunks (knowledge_base_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS file_chunks_tenant_id_idx ON file_chunks (tenant_id);
+
+SET maintenance_work_mem = '1GB';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS file_chunks_embedding_idx ON file_chunks USING hnsw (embedding vector_cosine_ops);
+RESET maintenance_work_mem;
+
+-- pgvector >= 0.8 keeps scanning the HNSW graph until enough rows pass the tenant filter.
+-- Older versions return fewer than k rows for small tenants, so upgrade the extension first.
+DO $$
+BEGIN
+  IF string_to_array((SELECT extversion FROM pg_extension WHERE extname = 'vector'), '.')::int[] >= '{0,8,0}' THEN
+    EXECUTE format('ALTER DATABASE %I SET hnsw.iterative_scan = strict_order', current_database());
+  ELSE
+    RAISE WARNING 'pgvector % has no hnsw.iterative_scan, so small tenants can get fewer than k results; upgrade to 0.8 or later',
+      (SELECT extversion FROM pg_extension WHERE extname = 'vector');
+  END IF;
+END
+$$;
+
+ANALYZE file_chunks;
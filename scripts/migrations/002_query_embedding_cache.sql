@@ -0,0 +1,10 @@
+-- Persistent backing table for the query embedding cache.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/002_query_embedding_cache.sql
+
+CREATE TABLE IF NOT EXISTS query_embedding_cache (
+  model TEXT NOT NULL,
+  query_hash TEXT NOT NULL,
+  embedding vector(768) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (model, query_hash)
+);
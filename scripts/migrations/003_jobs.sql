@@ -0,0 +1,21 @@
+-- Queue table for background ingestion jobs.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/003_jobs.sql
+
+-- Durable queue of background jobs, claimed by workers with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS jobs (
+  id SERIAL PRIMARY KEY,
+  kind TEXT NOT NULL,
+  tenant_id INTEGER REFERENCES tenants(id) ON DELETE CASCADE,
+  status TEXT NOT NULL DEFAULT 'queued',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  payload JSONB NOT NULL DEFAULT '{}',
+  progress JSONB NOT NULL DEFAULT '{}',
+  result JSONB,
+  error TEXT,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  started_at TIMESTAMPTZ,
+  heartbeat_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS jobs_claimable_idx ON jobs (id) WHERE status IN ('queued', 'running');
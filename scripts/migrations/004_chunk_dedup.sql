@@ -0,0 +1,17 @@
+-- Content hashes for file- and chunk-level dedup.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/004_chunk_dedup.sql
+
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS file_hash TEXT;
+ALTER TABLE file_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- A tenant stores each distinct file once; existing rows have no hash and never conflict
+CREATE UNIQUE INDEX IF NOT EXISTS knowledge_base_tenant_file_hash_idx ON knowledge_base (tenant_id, file_hash);
+
+-- Content-addressed embeddings, keyed by sha256 of model and chunk text, so
+-- identical chunks are embedded once across files and tenants
+CREATE TABLE IF NOT EXISTS chunk_embeddings (
+  content_hash TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  embedding vector(768) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now()
+);
@@ -0,0 +1,9 @@
+-- Full-text search column for lexical and hybrid retrieval.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/005_file_chunks_tsv.sql
+-- Adding a stored generated column rewrites file_chunks, so run it in a maintenance window.
+
+ALTER TABLE file_chunks
+  ADD COLUMN IF NOT EXISTS content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', chunk_content)) STORED;
+
+-- Full-text index for lexical and hybrid retrieval of exact terms such as part numbers and error codes
+CREATE INDEX IF NOT EXISTS file_chunks_content_tsv_idx ON file_chunks USING gin (content_tsv);
@@ -0,0 +1,5 @@
+-- Index for keyset pagination of GET /files/{tenant_id}.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/006_knowledge_base_tenant_id_id.sql
+
+-- Lists a tenant's files in id order for keyset pagination
+CREATE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_tenant_id_id_idx ON knowledge_base (tenant_id, id);
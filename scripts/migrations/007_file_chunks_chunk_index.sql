@@ -0,0 +1,5 @@
+-- Store each chunk's position in its file, so adjacent retrieved chunks can be merged into one passage of context.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/007_file_chunks_chunk_index.sql
+-- Chunks ingested before this migration keep a NULL chunk_index and are used as separate passages.
+
+ALTER TABLE file_chunks ADD COLUMN IF NOT EXISTS chunk_index INTEGER;
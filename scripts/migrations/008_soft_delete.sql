@@ -0,0 +1,19 @@
+-- Soft deletion of tenants and files, whose chunks are then purged in batches by a background job.
+-- Run with: psql -v ON_ERROR_STOP=1 -f scripts/migrations/008_soft_delete.sql
+-- Run it before deploying the backend that deletes through purge jobs.
+
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+-- The name of a deleted tenant can be reused while it is being purged
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS tenants_name_idx ON tenants (name) WHERE deleted_at IS NULL;
+ALTER TABLE tenants DROP CONSTRAINT IF EXISTS tenants_name_key;
+
+-- A tenant stores each distinct file once, and can upload a deleted file again while it is being purged
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_tenant_file_hash_live_idx
+  ON knowledge_base (tenant_id, file_hash) WHERE deleted_at IS NULL;
+DROP INDEX CONCURRENTLY IF EXISTS knowledge_base_tenant_file_hash_idx;
+
+-- The few files awaiting a purge, looked up by every search to exclude their chunks
+CREATE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_deleted_idx ON knowledge_base (tenant_id)
+  WHERE deleted_at IS NOT NULL;